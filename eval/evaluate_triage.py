@@ -8,6 +8,10 @@ from datetime import datetime
 from eval.email_dataset import examples_triage
 
 from src.email_assistant.email_assistant import email_assistant
+from src.email_assistant.utils import configure_logging
+
+# Show the assistants' triage decisions while the evaluation runs
+configure_logging()
 
 # Client 
 client = Client()
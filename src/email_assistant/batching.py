@@ -0,0 +1,132 @@
+"""Micro-batching of concurrent triage calls into a single LLM request."""
+
+import asyncio
+import bisect
+import logging
+
+from pydantic import BaseModel, create_model
+
+logger = logging.getLogger(__name__)
+
+class TriageBatcher:
+    """Router that sends concurrent async classifications to the LLM as one request.
+
+    A call to ainvoke made while no other classification is pending or running is sent on its
+    own right away. Calls arriving while the batcher is busy (a burst of emails triaged with
+    ainvoke/abatch) are grouped by system prompt and email length for up to max_wait seconds,
+    and each group is classified with one structured-output call returning a list of results.
+    invoke() is not batched.
+    """
+
+    def __init__(self, llm, schema: type[BaseModel], max_batch_size: int = 8, max_wait: float = 0.1, max_batch_chars: int = 16000, length_bins: tuple[int, ...] = (2000, 8000)):
+        """Create a batcher.
+
+        Args:
+            llm: Chat model used for the classifications
+            schema: Pydantic model of one classification, e.g. RouterSchema
+            max_batch_size: A group is sent as soon as it has this many emails
+            max_wait: Seconds to wait for more emails before sending a group
+            max_batch_chars: A group is also sent before its emails would exceed this many
+                characters (roughly 4k tokens), so one batched prompt stays short
+            length_bins: Email lengths (in characters) separating the groups, so short emails
+                aren't batched with (and slowed down by) long threads
+        """
+        # Strict JSON-schema decoding: the reply is the bare JSON object, with no tool-call
+        # wrapper, and always parses
+        self.router = llm.with_structured_output(schema, method="json_schema", strict=True)
+        batch_schema = create_model(f"{schema.__name__}Batch", results=(list[schema], ...))
+        batch_schema.__doc__ = "Results for each of the numbered inputs, in the same order."
+        self.batch_router = llm.with_structured_output(batch_schema, method="json_schema", strict=True)
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.max_batch_chars = max_batch_chars
+        self.length_bins = length_bins
+        # (system prompt, length bin) -> [(messages, future)] waiting to be sent, and their
+        # emails' length
+        self._pending: dict[tuple[str, int], list[tuple[list[dict], asyncio.Future]]] = {}
+        self._pending_chars: dict[tuple[str, int], int] = {}
+        self._timers: dict[tuple[str, int], asyncio.TimerHandle] = {}
+        # Classification calls in flight; the event loop only keeps weak references to tasks
+        self._tasks: set[asyncio.Task] = set()
+
+    def invoke(self, messages: list[dict]):
+        """Classify one email (no batching)."""
+        return self.router.invoke(messages)
+
+    async def ainvoke(self, messages: list[dict]):
+        """Classify one email, batched with other emails classified at the same time.
+
+        Args:
+            messages: [system message, user message] dicts, as passed to the router
+
+        Returns:
+            The structured result for this email
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        if not self._pending and not self._tasks:
+            # Nothing to batch with, so don't wait for company
+            self._start([(messages, future)])
+            return await future
+        chars = len(messages[-1]["content"])
+        key = (messages[0]["content"], bisect.bisect(self.length_bins, chars))
+        if key in self._pending and self._pending_chars[key] + chars > self.max_batch_chars:
+            self._flush(key)
+        group = self._pending.setdefault(key, [])
+        group.append((messages, future))
+        self._pending_chars[key] = self._pending_chars.get(key, 0) + chars
+        if len(group) >= self.max_batch_size:
+            self._flush(key)
+        elif key not in self._timers:
+            self._timers[key] = loop.call_later(self.max_wait, self._flush, key)
+        return await future
+
+    def _flush(self, key: tuple[str, int]) -> None:
+        """Send the pending group for a system prompt and length bin."""
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        group = self._pending.pop(key, None)
+        self._pending_chars.pop(key, None)
+        if group:
+            self._start(group)
+
+    def _start(self, group: list[tuple[list[dict], asyncio.Future]]) -> None:
+        """Classify a group in a new task, keeping a reference until it finishes."""
+        task = asyncio.ensure_future(self._classify(group))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _classify(self, group: list[tuple[list[dict], asyncio.Future]]) -> None:
+        """Classify a group with one LLM call and resolve each caller's future."""
+        try:
+            results = await self._classify_batch([messages for messages, _ in group])
+        except Exception as error:
+            for _, future in group:
+                if not future.done():
+                    future.set_exception(error)
+            return
+        for (_, future), result in zip(group, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def _classify_batch(self, batch: list[list[dict]]) -> list:
+        """Classify several emails that share a system prompt."""
+        if len(batch) == 1:
+            return [await self.router.ainvoke(batch[0])]
+
+        emails = "\n\n".join(
+            f"<email number={i}>\n{messages[-1]['content']}\n</email>" for i, messages in enumerate(batch, 1)
+        )
+        response = await self.batch_router.ainvoke([
+            batch[0][0],
+            {"role": "user", "content": f"Classify each of the following {len(batch)} emails independently, "
+                                        f"returning exactly {len(batch)} results in the same order.\n\n{emails}"},
+        ])
+        results: list | None = getattr(response, "results", None)
+        if results is None or len(results) != len(batch):
+            # Don't guess which result belongs to which email
+            logger.warning("Batched triage returned %s results for %d emails, classifying them one by one",
+                           None if results is None else len(results), len(batch))
+            return list(await asyncio.gather(*(self.router.ainvoke(messages) for messages in batch)))
+        return results
@@ -0,0 +1,352 @@
+"""Caches that let the email assistant skip repeated LLM calls."""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    # numpy is imported by the methods that need it, so graphs that only use the LLM cache
+    # don't load it at import
+    import numpy as np
+
+logger = logging.getLogger(__name__)
+
+class SemanticCache:
+    """Cache LLM results keyed by the embedding of the prompt that produced them.
+
+    Entries are grouped by namespace (e.g. a hash of the system prompt), so a result is
+    only reused for prompts built from the same instructions. Lookups are a cosine-similarity
+    search over a matrix of normalized embeddings.
+    """
+
+    def __init__(self, embeddings=None, threshold: float = 0.92, ttl: float | None = 24 * 60 * 60, max_chars: int = 8000, max_entries: int = 2048, cache_dir: str | None = None):
+        """Create an empty cache.
+
+        Args:
+            embeddings: LangChain embeddings model, defaults to OpenAI text-embedding-3-small
+            threshold: Minimum cosine similarity for a lookup to count as a hit
+            ttl: Seconds an entry stays valid, or None to keep entries forever
+            max_chars: Text is truncated to this many characters before embedding
+            max_entries: Entries kept per namespace (oldest are dropped first), and number of
+                recent embeddings kept so an identical text isn't embedded twice
+            cache_dir: Directory where embeddings are also saved, so other processes (and
+                later runs) reuse them; defaults to $EMBEDDING_CACHE_DIR, unset keeps them in memory only
+        """
+        self._embeddings = embeddings
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_chars = max_chars
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir if cache_dir is not None else os.environ.get("EMBEDDING_CACHE_DIR") or None
+        # namespace -> (embedding matrix, cached values, insertion timestamps); the matrix has
+        # spare rows for new entries, and only its first len(values) rows are in use
+        self._entries: dict[str, tuple[np.ndarray, list[Any], list[float]]] = {}
+        # text -> normalized embedding, in least-recently-used order
+        self._vectors: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def embeddings(self):
+        """Embeddings model, created on first use so importing this module needs no credentials."""
+        if self._embeddings is None:
+            from langchain_openai import OpenAIEmbeddings
+            self._embeddings = OpenAIEmbeddings(model="text-embedding-3-small")
+        return self._embeddings
+
+    def embed(self, text: str) -> np.ndarray:
+        """Embed text as a unit-length vector.
+
+        Args:
+            text: Text to embed
+
+        Returns:
+            np.ndarray: Normalized embedding
+        """
+        text = text[: self.max_chars]
+        vector = self._recent_vector(text)
+        if vector is None:
+            vector = self._stored_vector(text)
+        if vector is None:
+            vector = self._store_vector(text, self._normalize(self.embeddings.embed_query(text)))
+        return vector
+
+    async def aembed(self, text: str) -> np.ndarray:
+        """Async version of embed."""
+        text = text[: self.max_chars]
+        vector = self._recent_vector(text)
+        if vector is None:
+            vector = self._stored_vector(text)
+        if vector is None:
+            vector = self._store_vector(text, self._normalize(await self.embeddings.aembed_query(text)))
+        return vector
+
+    def _recent_vector(self, text: str) -> np.ndarray | None:
+        """Return the embedding of text if it was computed recently."""
+        with self._lock:
+            vector = self._vectors.get(text)
+            if vector is not None:
+                self._vectors.move_to_end(text)
+            return vector
+
+    def _remember_vector(self, text: str, vector: np.ndarray) -> np.ndarray:
+        """Keep the embedding of text for repeated lookups, dropping the least recently used."""
+        with self._lock:
+            self._vectors[text] = vector
+            if len(self._vectors) > self.max_entries:
+                self._vectors.popitem(last=False)
+        return vector
+
+    def _vector_path(self, text: str) -> str:
+        """File holding the embedding of text, addressed by a hash of the model and the text."""
+        model = getattr(self.embeddings, "model", type(self.embeddings).__name__)
+        digest = hashlib.sha256(f"{model}\x00{text}".encode()).hexdigest()
+        return os.path.join(self.cache_dir, f"{digest}.npy")
+
+    def _stored_vector(self, text: str) -> np.ndarray | None:
+        """Load the embedding of text from cache_dir, if this or another process saved it."""
+        if self.cache_dir is None:
+            return None
+        import numpy as np
+        try:
+            vector = np.load(self._vector_path(text))
+        except (OSError, ValueError):
+            return None
+        # Upcast for the float32 similarity matrix (the rounding moves cosine scores by ~1e-4)
+        return self._remember_vector(text, vector.astype(np.float32))
+
+    def _store_vector(self, text: str, vector: np.ndarray) -> np.ndarray:
+        """Keep a new embedding in memory and, with a cache_dir, on disk."""
+        if self.cache_dir is not None:
+            import numpy as np
+            path = self._vector_path(text)
+            # Written to a temporary file and renamed, so readers never see a partial file
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                with open(tmp_path, "wb") as f:
+                    # Saved as float16, half the size of the float32 embedding
+                    np.save(f, vector.astype(np.float16))
+                os.replace(tmp_path, path)
+            except OSError as error:
+                logger.warning("Could not save embedding to %s: %s", self.cache_dir, error)
+        return self._remember_vector(text, vector)
+
+    @staticmethod
+    def _normalize(embedding: list[float]) -> np.ndarray:
+        """Convert an embedding to a unit-length float32 vector."""
+        import numpy as np
+        vector = np.asarray(embedding, dtype=np.float32)
+        return vector / np.linalg.norm(vector)
+
+    def lookup(self, namespace: str, vector: np.ndarray) -> Any | None:
+        """Return the cached value closest to vector, if it is similar enough.
+
+        Args:
+            namespace: Namespace to search
+            vector: Normalized query embedding
+
+        Returns:
+            The cached value, or None on a miss
+        """
+        with self._lock:
+            self._evict_expired(namespace)
+            if namespace not in self._entries:
+                return None
+            matrix, values, _ = self._entries[namespace]
+            scores = matrix[: len(values)] @ vector
+            best = int(scores.argmax())
+            if scores[best] >= self.threshold:
+                return values[best]
+            return None
+
+    def insert(self, namespace: str, vector: np.ndarray, value: Any) -> None:
+        """Add a value to the cache.
+
+        Args:
+            namespace: Namespace to add the entry to
+            vector: Normalized embedding of the prompt
+            value: Value to return for similar prompts
+        """
+        import numpy as np
+        with self._lock:
+            if namespace in self._entries:
+                matrix, values, timestamps = self._entries[namespace]
+            else:
+                matrix, values, timestamps = np.empty((min(16, self.max_entries), vector.shape[0]), dtype=vector.dtype), [], []
+            size = len(values)
+            if size >= self.max_entries:
+                # Entries are in insertion order, so the oldest ones form a prefix: shift the
+                # rest down to make room
+                drop = size - self.max_entries + 1
+                matrix[: size - drop] = matrix[drop:size]
+                values, timestamps = values[drop:], timestamps[drop:]
+                size -= drop
+            elif size == len(matrix):
+                # Grow the matrix geometrically, so an insert doesn't copy every embedding
+                grown = np.empty((min(2 * size, self.max_entries), matrix.shape[1]), dtype=matrix.dtype)
+                grown[:size] = matrix[:size]
+                matrix = grown
+            matrix[size] = vector
+            values.append(value)
+            timestamps.append(time.monotonic())
+            self._entries[namespace] = (matrix, values, timestamps)
+
+    def evict(self, namespace: str, vector: np.ndarray) -> int:
+        """Drop the entries a lookup for vector would return, e.g. a decision the user overrode.
+
+        Args:
+            namespace: Namespace to search
+            vector: Normalized query embedding
+
+        Returns:
+            int: Number of entries dropped
+        """
+        import numpy as np
+        with self._lock:
+            if namespace not in self._entries:
+                return 0
+            matrix, values, timestamps = self._entries[namespace]
+            keep = np.flatnonzero(matrix[: len(values)] @ vector < self.threshold)
+            dropped = len(values) - len(keep)
+            if not keep.size:
+                del self._entries[namespace]
+            elif dropped:
+                # The kept entries stay in insertion order, as _evict_expired expects
+                self._entries[namespace] = (matrix[keep], [values[i] for i in keep], [timestamps[i] for i in keep])
+            return dropped
+
+    def _evict_expired(self, namespace: str) -> None:
+        """Drop entries older than the TTL (caller holds the lock)."""
+        if self.ttl is None or namespace not in self._entries:
+            return
+        matrix, values, timestamps = self._entries[namespace]
+        cutoff = time.monotonic() - self.ttl
+        # Entries are appended in time order, so expired ones form a prefix
+        expired = next((i for i, ts in enumerate(timestamps) if ts >= cutoff), len(timestamps))
+        if expired == len(timestamps):
+            del self._entries[namespace]
+        elif expired:
+            self._entries[namespace] = (matrix[expired:], values[expired:], timestamps[expired:])
+
+# Exact-match cache for chat model calls: an identical prompt sent to the same model with the
+# same tools and settings (replayed emails, retries, eval reruns) returns the earlier response.
+# Off by default, since it makes repeated prompts return the same completion; set
+# LLM_CACHE_ENABLE=1 to turn it on.
+LLM_CACHE_MAXSIZE = 1024
+
+@functools.cache
+def get_llm_cache():
+    """Cache to pass as the chat model's cache, or None (no caching) unless LLM_CACHE_ENABLE is set."""
+    if os.environ.get("LLM_CACHE_ENABLE", "").lower() not in {"1", "true", "yes"}:
+        return None
+    from langchain_core.caches import InMemoryCache
+    return InMemoryCache(maxsize=LLM_CACHE_MAXSIZE)
+
+class SingleFlight:
+    """Coalesce concurrent identical async calls into a single in-flight call.
+
+    The first caller for a key starts the call; callers arriving while it is running await
+    the same result (or exception) instead of starting their own.
+    """
+
+    def __init__(self):
+        """Create an empty in-flight table."""
+        self._in_flight: dict[str, asyncio.Task] = {}
+
+    async def run(self, key: str, call):
+        """Run call() unless a call for key is already in flight, then return its result.
+
+        Args:
+            key: Identity of the call, e.g. a hash of its inputs
+            call: Zero-argument function returning a coroutine
+
+        Returns:
+            The result of the (shared) call
+        """
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(call())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        # Shield so one cancelled waiter does not cancel the call for everyone else
+        return await asyncio.shield(task)
+
+@functools.lru_cache(maxsize=64)
+def prompt_namespace(system_prompt: str) -> str:
+    """Cache namespace of a system prompt (hashed once per distinct prompt)."""
+    return hashlib.sha256(system_prompt.encode()).hexdigest()
+
+class CachingRouter:
+    """Wrap a structured-output router so near-duplicate emails reuse an earlier classification.
+
+    The system prompt selects the cache namespace and the user prompt (the email) is embedded
+    for the similarity lookup.
+    """
+
+    def __init__(self, router, cache: SemanticCache | None = None):
+        """Wrap a router.
+
+        Args:
+            router: Runnable returning a structured result, e.g. llm.with_structured_output(RouterSchema)
+            cache: Semantic cache to use, defaults to a new SemanticCache
+        """
+        self.router = router
+        self.cache = cache if cache is not None else SemanticCache()
+        self._single_flight = SingleFlight()
+
+    @staticmethod
+    def _key(messages: list[dict]) -> str:
+        """Hash identifying the exact messages, for coalescing concurrent calls."""
+        return hashlib.blake2b("\x00".join(m["content"] for m in messages).encode(), digest_size=16).hexdigest()
+
+    def invoke(self, messages: list[dict]):
+        """Classify using the cache, falling back to the router on a miss.
+
+        Args:
+            messages: [system message, user message] dicts, as passed to the router
+
+        Returns:
+            The router's structured result
+        """
+        namespace = prompt_namespace(messages[0]["content"])
+        vector = self.cache.embed(messages[-1]["content"])
+        result = self.cache.lookup(namespace, vector)
+        if result is None:
+            result = self.router.invoke(messages)
+            self.cache.insert(namespace, vector, result)
+        return result
+
+    def forget(self, messages: list[dict]) -> None:
+        """Drop cached classifications that would be reused for these messages.
+
+        Args:
+            messages: [system message, user message] dicts, as passed to the router
+        """
+        namespace = prompt_namespace(messages[0]["content"])
+        self.cache.evict(namespace, self.cache.embed(messages[-1]["content"]))
+
+    async def ainvoke(self, messages: list[dict]):
+        """Async version of invoke.
+
+        Concurrent calls with identical messages (duplicate deliveries, retries) share one
+        cache lookup and at most one router call.
+        """
+        return await self._single_flight.run(self._key(messages), lambda: self._ainvoke(messages))
+
+    async def _ainvoke(self, messages: list[dict]):
+        """Look up messages in the cache, calling the router on a miss."""
+        namespace = prompt_namespace(messages[0]["content"])
+        vector = await self.cache.aembed(messages[-1]["content"])
+        result = self.cache.lookup(namespace, vector)
+        if result is None:
+            result = await self.router.ainvoke(messages)
+            self.cache.insert(namespace, vector, result)
+        return result
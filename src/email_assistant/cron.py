@@ -1,10 +1,16 @@
 import os
 import sys
 import asyncio
+import logging
 from typing import Dict, Any, TypedDict
 from dataclasses import dataclass, field
 from langgraph.graph import StateGraph, START, END
 from email_assistant.tools.gmail.run_ingest import fetch_and_process_emails
+from email_assistant.utils import configure_logging
+
+# The cron job is an application entry point, so it sets up printing of the package's logs
+configure_logging()
+logger = logging.getLogger(__name__)
 
 @dataclass(kw_only=True)
 class JobKickoff:
@@ -20,10 +26,8 @@ class JobKickoff:
 
 async def main(state: JobKickoff):
     """Run the email ingestion process"""
-    print(f"Kicking off job to fetch emails from the past {state.minutes_since} minutes")
-    print(f"Email: {state.email}")
-    print(f"URL: {state.url}")
-    print(f"Graph name: {state.graph_name}")
+    logger.info("Kicking off job to fetch emails from the past %s minutes (email: %s, URL: %s, graph: %s)",
+                state.minutes_since, state.email, state.url, state.graph_name)
     
     try:
         # Convert state to args object for fetch_and_process_emails
@@ -31,7 +35,6 @@ async def main(state: JobKickoff):
             def __init__(self, **kwargs):
                 for key, value in kwargs.items():
                     setattr(self, key, value)
-                print(f"Created Args with attributes: {dir(self)}")
         
         args = Args(
             email=state.email,
@@ -44,21 +47,14 @@ async def main(state: JobKickoff):
             skip_filters=state.skip_filters
         )
         
-        # Print email and URL to verify they're being passed correctly
-        print(f"Args email: {args.email}")
-        print(f"Args url: {args.url}")
-        
         # Run the ingestion process
-        print("Starting fetch_and_process_emails...")
         result = await fetch_and_process_emails(args)
-        print(f"fetch_and_process_emails returned: {result}")
+        logger.info("fetch_and_process_emails returned: %s", result)
         
         # Return the result status
         return {"status": "success" if result == 0 else "error", "exit_code": result}
     except Exception as e:
-        import traceback
-        print(f"Error in cron job: {str(e)}")
-        print(traceback.format_exc())
+        logger.exception("Error in cron job: %s", e)
         return {"status": "error", "error": str(e)}
 
 # Build the graph
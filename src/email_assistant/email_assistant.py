@@ -1,29 +1,72 @@
+import asyncio
+import functools
+import logging
 from typing import Literal
-
-from langchain.chat_models import init_chat_model
+from types import MappingProxyType
 
 from src.email_assistant.tools import get_tools, get_tools_by_name
 from src.email_assistant.tools.default.prompt_templates import AGENT_TOOLS_PROMPT
 from src.email_assistant.prompts import triage_system_prompt, triage_user_prompt, agent_system_prompt, default_background, default_triage_instructions, default_response_preferences, default_cal_preferences
 from src.email_assistant.schemas import State, RouterSchema, StateInput
-from src.email_assistant.utils import parse_email, format_email_markdown
+from src.email_assistant.batching import TriageBatcher
+from src.email_assistant.cache import get_llm_cache
+from src.email_assistant.utils import parse_email, format_email_markdown, is_bulk_email
 
+from langchain_core.runnables import RunnableLambda
+from langchain_core.utils.function_calling import convert_to_openai_tool
 from langgraph.graph import StateGraph, START, END
 from langgraph.types import Command
 from dotenv import load_dotenv
 load_dotenv(".env")
 
-# Get tools
-tools = get_tools()
-tools_by_name = get_tools_by_name(tools)
-
-# Initialize the LLM for use with router / structured output
-llm = init_chat_model("openai:gpt-4.1", temperature=0.0)
-llm_router = llm.with_structured_output(RouterSchema) 
+logger = logging.getLogger(__name__)
 
-# Initialize the LLM, enforcing tool use (of any available tools) for agent
-llm = init_chat_model("openai:gpt-4.1", temperature=0.0)
-llm_with_tools = llm.bind_tools(tools, tool_choice="any")
+# Get tools
+tools = tuple(get_tools())
+# Read-only view: the tool set is fixed once the module is loaded
+tools_by_name = MappingProxyType(get_tools_by_name(tools))
+
+# OpenAI schemas of the tools, converted once at import rather than by bind_tools when the
+# agent LLM is first built
+TOOL_SCHEMAS = tuple(convert_to_openai_tool(tool) for tool in tools)
+
+# LLMs are built on first use (not at import) and a single chat model is shared
+@functools.cache
+def get_llm():
+    """Initialize the chat model shared by the router and the agent."""
+    from langchain.chat_models import init_chat_model
+    return init_chat_model("openai:gpt-4.1", temperature=0.0, cache=get_llm_cache())
+
+@functools.cache
+def get_llm_router():
+    """Get the LLM for use with router / structured output (strict JSON schema, no tool-call wrapper).
+
+    Emails triaged concurrently (graph ainvoke/abatch) are classified together in one LLM call.
+    """
+    return TriageBatcher(get_llm(), RouterSchema)
+
+# The agent's prompt prefix (tool schemas, then the static system prompt) is well over
+# OpenAI's 1024-token minimum for prompt caching. Tagging the calls with a shared cache key
+# routes them to the same cache, so the prefix is only prefilled once per burst of calls.
+AGENT_PROMPT_CACHE_KEY = "email_assistant-agent"
+
+@functools.cache
+def get_llm_with_tools():
+    """Get the LLM, enforcing tool use (of any available tools) for agent."""
+    return get_llm().bind(tools=list(TOOL_SCHEMAS), tool_choice="required", prompt_cache_key=AGENT_PROMPT_CACHE_KEY)
+
+# The system prompts only depend on defaults, so they are formatted once at import
+AGENT_SYSTEM_MESSAGE = {"role": "system", "content": agent_system_prompt.format(
+    tools_prompt=AGENT_TOOLS_PROMPT,
+    background=default_background,
+    response_preferences=default_response_preferences, 
+    cal_preferences=default_cal_preferences)
+}
+
+TRIAGE_SYSTEM_PROMPT = triage_system_prompt.format(
+    background=default_background,
+    triage_instructions=default_triage_instructions
+)
 
 # Nodes
 def llm_call(state: State):
@@ -31,21 +74,14 @@ def llm_call(state: State):
 
     return {
         "messages": [
-            llm_with_tools.invoke(
-                [
-                    {"role": "system", "content": agent_system_prompt.format(
-                        tools_prompt=AGENT_TOOLS_PROMPT,
-                        background=default_background,
-                        response_preferences=default_response_preferences, 
-                        cal_preferences=default_cal_preferences)
-                    },
-                    
-                ]
-                + state["messages"]
-            )
+            get_llm_with_tools().invoke([AGENT_SYSTEM_MESSAGE, *state["messages"]])
         ]
     }
 
+async def allm_call(state: State):
+    """Async version of llm_call."""
+    return {"messages": [await get_llm_with_tools().ainvoke([AGENT_SYSTEM_MESSAGE, *state["messages"]])]}
+
 def tool_node(state: State):
     """Performs the tool call"""
 
@@ -56,24 +92,36 @@ def tool_node(state: State):
         result.append({"role": "tool", "content" : observation, "tool_call_id": tool_call["id"]})
     return {"messages": result}
 
+async def atool_node(state: State):
+    """Async version of tool_node, running the tool calls concurrently."""
+    tool_calls = state["messages"][-1].tool_calls
+    observations = await asyncio.gather(
+        *(tools_by_name[tool_call["name"]].ainvoke(tool_call["args"]) for tool_call in tool_calls)
+    )
+    return {"messages": [
+        {"role": "tool", "content": observation, "tool_call_id": tool_call["id"]}
+        for tool_call, observation in zip(tool_calls, observations)
+    ]}
+
 # Conditional edge function
 def should_continue(state: State) -> Literal["Action", "__end__"]:
     """Route to Action, or end if Done tool called"""
     messages = state["messages"]
     last_message = messages[-1]
-    if last_message.tool_calls:
-        for tool_call in last_message.tool_calls: 
-            if tool_call["name"] == "Done":
-                return END
-            else:
-                return "Action"
+    # Done ends the run once it is the only call left; any other call (issued alone or next to
+    # Done) is run first
+    if last_message.tool_calls and all(tool_call["name"] == "Done" for tool_call in last_message.tool_calls):
+        return END
+    return "Action"
 
 # Build workflow
 agent_builder = StateGraph(State)
 
 # Add nodes
-agent_builder.add_node("llm_call", llm_call)
-agent_builder.add_node("environment", tool_node)
+# invoke() runs the sync functions and ainvoke()/abatch() their async versions, so many
+# emails can be handled concurrently on one event loop
+agent_builder.add_node("llm_call", RunnableLambda(llm_call, afunc=allm_call, name="llm_call"))
+agent_builder.add_node("environment", RunnableLambda(tool_node, afunc=atool_node, name="environment"))
 
 # Add edges to connect nodes
 agent_builder.add_edge(START, "llm_call")
@@ -91,6 +139,16 @@ agent_builder.add_edge("environment", "llm_call")
 # Compile the agent
 agent = agent_builder.compile()
 
+def build_triage_messages(author, to, subject, email_thread) -> list[dict]:
+    """Build the router messages for an email."""
+    user_prompt = triage_user_prompt.format(
+        author=author, to=to, subject=subject, email_thread=email_thread
+    )
+    return [
+        {"role": "system", "content": TRIAGE_SYSTEM_PROMPT},
+        {"role": "user", "content": user_prompt},
+    ]
+
 def triage_router(state: State) -> Command[Literal["response_agent", "__end__"]]:
     """Analyze email content to decide if we should respond, notify, or ignore.
 
@@ -100,60 +158,58 @@ def triage_router(state: State) -> Command[Literal["response_agent", "__end__"]]
     - Messages meant for other teams
     """
     author, to, subject, email_thread = parse_email(state["email_input"])
-    system_prompt = triage_system_prompt.format(
-        background=default_background,
-        triage_instructions=default_triage_instructions
-    )
-
-    user_prompt = triage_user_prompt.format(
-        author=author, to=to, subject=subject, email_thread=email_thread
-    )
 
-    # Create email markdown for Agent Inbox in case of notification  
-    email_markdown = format_email_markdown(subject, author, to, email_thread)
+    # Bulk mail (newsletters, notification digests) is ignored without calling the router LLM
+    if is_bulk_email(email_thread):
+        return route_triage("ignore", format_email_markdown(subject, author, to, email_thread))
 
     # Run the router LLM
-    result = llm_router.invoke(
-        [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt},
-        ]
-    )
+    result = get_llm_router().invoke(build_triage_messages(author, to, subject, email_thread))
+
+    # Create email markdown for the response agent
+    return route_triage(result.classification, format_email_markdown(subject, author, to, email_thread))
+
+async def atriage_router(state: State) -> Command[Literal["response_agent", "__end__"]]:
+    """Async version of triage_router, so many emails can be triaged on one event loop."""
+    author, to, subject, email_thread = parse_email(state["email_input"])
+
+    if is_bulk_email(email_thread):
+        return route_triage("ignore", format_email_markdown(subject, author, to, email_thread))
 
-    # Decision
-    classification = result.classification
+    result = await get_llm_router().ainvoke(build_triage_messages(author, to, subject, email_thread))
+    return route_triage(result.classification, format_email_markdown(subject, author, to, email_thread))
 
+def route_triage(classification: str, email_markdown: str) -> Command[Literal["response_agent", "__end__"]]:
+    """Turn the router's classification into the next step of the workflow."""
     if classification == "respond":
-        print("📧 Classification: RESPOND - This email requires a response")
         goto = "response_agent"
         # Add the email to the messages
         update = {
-            "classification_decision": result.classification,
+            "classification_decision": classification,
             "messages": [{"role": "user",
                             "content": f"Respond to the email: {email_markdown}"
                         }],
         }
-    elif result.classification == "ignore":
-        print("🚫 Classification: IGNORE - This email can be safely ignored")
+    elif classification == "ignore":
         update =  {
-            "classification_decision": result.classification,
+            "classification_decision": classification,
         }
         goto = END
-    elif result.classification == "notify":
+    elif classification == "notify":
         # If real life, this would do something else
-        print("🔔 Classification: NOTIFY - This email contains important information")
         update = {
-            "classification_decision": result.classification,
+            "classification_decision": classification,
         }
         goto = END
     else:
-        raise ValueError(f"Invalid classification: {result.classification}")
+        raise ValueError(f"Invalid classification: {classification}")
+    logger.info("Classification: %s", classification)
     return Command(goto=goto, update=update)
 
 # Build workflow
 overall_workflow = (
     StateGraph(State, input=StateInput)
-    .add_node(triage_router)
+    .add_node("triage_router", RunnableLambda(triage_router, afunc=atriage_router, name="triage_router"), destinations=("response_agent", END))
     .add_node("response_agent", agent)
     .add_edge(START, "triage_router")
 )
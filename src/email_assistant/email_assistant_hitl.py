@@ -1,32 +1,218 @@
-from typing import Literal
+import asyncio
+import functools
+import logging
+from typing import Literal, get_args
+from types import MappingProxyType
 
-from langchain.chat_models import init_chat_model
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+from langchain_core.runnables.config import ContextThreadPoolExecutor
+from langchain_core.utils.function_calling import convert_to_openai_tool
 
 from langgraph.graph import StateGraph, START, END
 from langgraph.types import interrupt, Command
 
-from src.email_assistant.tools import get_tools, get_tools_by_name
+from src.email_assistant.tools import get_tools, get_tools_by_name, get_tool_runner, dedupe_tool_calls
 from src.email_assistant.tools.default.prompt_templates import HITL_TOOLS_PROMPT
 from src.email_assistant.prompts import triage_system_prompt, triage_user_prompt, agent_system_prompt_hitl, default_background, default_triage_instructions, default_response_preferences, default_cal_preferences
-from src.email_assistant.schemas import State, RouterSchema, StateInput
-from src.email_assistant.utils import parse_email, format_for_display, format_email_markdown
+from src.email_assistant.schemas import State, RouterSchema, RouterDecision, StateInput
+from src.email_assistant.cache import CachingRouter, get_llm_cache
+from src.email_assistant.utils import parse_email, format_for_display, format_email_markdown, truncate_email_thread, is_bulk_email
 from dotenv import load_dotenv
 
 load_dotenv(".env")
 
-# Get tools
-tools = get_tools(["write_email", "schedule_meeting", "check_calendar_availability", "Question", "Done"])
-tools_by_name = get_tools_by_name(tools)
+logger = logging.getLogger(__name__)
 
-# Initialize the LLM for use with router / structured output
-llm = init_chat_model("openai:gpt-4.1", temperature=0.0)
-llm_router = llm.with_structured_output(RouterSchema) 
+# Get tools
+tools = tuple(get_tools(["write_email", "schedule_meeting", "check_calendar_availability", "Question", "Done"]))
+# Read-only views: the tool set is fixed once the module is loaded
+tools_by_name = MappingProxyType(get_tools_by_name(tools))
+# Executes the agent's tool calls, calling the underlying functions directly
+run_tool = get_tool_runner(tools)
+
+# OpenAI schemas of the tools, converted once at import (before any worker fork) rather than
+# by bind_tools when the agent LLM is first built
+TOOL_SCHEMAS = tuple(convert_to_openai_tool(tool) for tool in tools)
+
+# Tools that need human review in Agent Inbox
+HITL_TOOL_NAMES = frozenset({"write_email", "schedule_meeting", "Question"})
+
+# Thread pool for tools that run without human review (copies the context so tracing still works)
+tool_executor = ContextThreadPoolExecutor(max_workers=4)
+
+# LLMs are built on first use (not at import) and a single chat model is shared
+@functools.cache
+def get_llm():
+    """Initialize the chat model shared by the router and the agent."""
+    from langchain.chat_models import init_chat_model
+    return init_chat_model("openai:gpt-4.1", temperature=0.0, cache=get_llm_cache())
+
+# Single-field routing tool: the router emits only the classification, without the
+# free-text reasoning that RouterSchema asks for. The tool is already in OpenAI's format, so
+# langchain passes it through as is: strict decoding has to be requested in the schema itself
+classify_tool = {
+    "type": "function",
+    "function": {
+        "name": "classify",
+        "description": RouterSchema.__doc__,
+        "strict": True,
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "classification": RouterSchema.model_json_schema()["properties"]["classification"],
+            },
+            "required": ["classification"],
+            "additionalProperties": False,
+        },
+    },
+}
+
+def parse_classification(message: AIMessage) -> RouterDecision:
+    """Read the classification from the forced classify tool call."""
+    if not message.tool_calls:
+        raise ValueError(f"Router did not call the classify tool: {message.content!r}")
+    classification = message.tool_calls[0]["args"].get("classification")
+    if classification not in get_args(RouterDecision.__annotations__["classification"]):
+        raise ValueError(f"Invalid classification: {classification!r}")
+    return RouterDecision(classification)
+
+@functools.cache
+def get_llm_router():
+    """Get the LLM for use with router, forced to call the classify tool.
+
+    Near-duplicate emails (newsletters, repeated threads) reuse an earlier classification.
+    """
+    router = get_llm().bind_tools([classify_tool], tool_choice="classify") | parse_classification
+    return CachingRouter(router)
+
+# The agent's prompt prefix (tool schemas, then the static system prompt) is well over
+# OpenAI's 1024-token minimum for prompt caching. Tagging the calls with a shared cache key
+# routes them to the same cache, so the prefix is only prefilled once per burst of calls.
+AGENT_PROMPT_CACHE_KEY = "email_assistant_hitl-agent"
+
+@functools.cache
+def get_llm_with_tools():
+    """Agent LLM bound to the tools, enforcing tool use."""
+    return get_llm().bind(tools=list(TOOL_SCHEMAS), tool_choice="required", prompt_cache_key=AGENT_PROMPT_CACHE_KEY)
+
+# The triage system prompt only depends on defaults, so format it once at import
+TRIAGE_SYSTEM_PROMPT = triage_system_prompt.format(
+    background=default_background,
+    triage_instructions=default_triage_instructions
+)
 
-# Initialize the LLM, enforcing tool use (of any available tools) for agent
-llm = init_chat_model("openai:gpt-4.1", temperature=0.0)
-llm_with_tools = llm.bind_tools(tools, tool_choice="required")
+# Actions allowed in Agent Inbox for each kind of interrupt. Requests share these dicts,
+# so they are built once here and must not be mutated
+INTERRUPT_CONFIGS = {
+    "triage": {
+        "allow_ignore": True,
+        "allow_respond": True,
+        "allow_edit": False,
+        "allow_accept": False,
+    },
+    "write_email": {
+        "allow_ignore": True,
+        "allow_respond": True,
+        "allow_edit": True,
+        "allow_accept": True,
+    },
+    "schedule_meeting": {
+        "allow_ignore": True,
+        "allow_respond": True,
+        "allow_edit": True,
+        "allow_accept": True,
+    },
+    "Question": {
+        "allow_ignore": True,
+        "allow_respond": True,
+        "allow_edit": False,
+        "allow_accept": False,
+    },
+}
+
+# Tools whose drafts can be edited in Agent Inbox; an edit runs the tool with the edited args
+EDITABLE_TOOL_NAMES = frozenset(name for name, config in INTERRUPT_CONFIGS.items() if config["allow_edit"])
+
+# Message for the agent when the user ignores a tool call (the workflow then ends)
+IGNORE_MESSAGES = {
+    "write_email": "User ignored this email draft. Ignore this email and end the workflow.",
+    "schedule_meeting": "User ignored this calendar meeting draft. Ignore this email and end the workflow.",
+    "Question": "User ignored this question. Ignore this email and end the workflow.",
+}
+
+# Message for the agent when the user responds to a tool call with feedback
+RESPONSE_MESSAGES = {
+    "write_email": "User gave feedback, which can we incorporate into the email. Feedback: {feedback}",
+    "schedule_meeting": "User gave feedback, which can we incorporate into the meeting request. Feedback: {feedback}",
+    "Question": "User answered the question, which can we can use for any follow up actions. Feedback: {feedback}",
+}
+
+# The agent's system prompt only depends on defaults, so the message is built once and
+# reused on every step of the tool-calling loop
+AGENT_SYSTEM_MESSAGE = {"role": "system", "content": agent_system_prompt_hitl.format(
+    tools_prompt=HITL_TOOLS_PROMPT,
+    background=default_background,
+    response_preferences=default_response_preferences,
+    cal_preferences=default_cal_preferences
+)}
+
+# Bound once so building the user prompt skips the attribute lookup on every email
+format_triage_user_prompt = triage_user_prompt.format
 
 # Nodes 
+def build_triage_messages(email_input: dict) -> list[dict]:
+    """Build the router messages for an email."""
+    # Parse the email input
+    author, to, subject, email_thread = parse_email(email_input)
+    user_prompt = format_triage_user_prompt(
+        author=author, to=to, subject=subject, email_thread=email_thread
+    )
+
+    return [
+        {"role": "system", "content": TRIAGE_SYSTEM_PROMPT},
+        {"role": "user", "content": user_prompt},
+    ]
+
+# Next node for each classification
+TRIAGE_ROUTES = {
+    "respond": "response_agent",
+    "ignore": END,
+    "notify": "triage_interrupt_handler",
+}
+
+def email_preview_of(email_input: dict) -> str:
+    """Format the email as markdown for Agent Inbox, with long threads shortened.
+
+    The full email stays in the messages and in state["email_input"].
+    """
+    author, to, subject, email_thread = parse_email(email_input)
+    return format_email_markdown(subject, author, to, truncate_email_thread(email_thread))
+
+def route_triage(classification: str, email_input: dict) -> Command[Literal["triage_interrupt_handler", "response_agent", "__end__"]]:
+    """Turn the router's classification into the next step of the workflow."""
+    # Process the classification decision
+    if classification not in TRIAGE_ROUTES:
+        raise ValueError(f"Invalid classification: {classification}")
+    goto = TRIAGE_ROUTES[classification]
+    logger.info("Classification: %s", classification)
+
+    # Update the state
+    update = {
+        "classification_decision": classification,
+    }
+    # Formatted once here for every interrupt shown about this email
+    if goto != END:
+        update["email_preview"] = email_preview_of(email_input)
+    # The response agent starts from the email itself
+    if goto == "response_agent":
+        author, to, subject, email_thread = parse_email(email_input)
+        email_markdown = format_email_markdown(subject, author, to, email_thread)
+        update["messages"] = [{"role": "user",
+                                "content": f"Respond to the email: {email_markdown}"
+                            }]
+    return Command(goto=goto, update=update)
+
 def triage_router(state: State) -> Command[Literal["triage_interrupt_handler", "response_agent", "__end__"]]:
     """Analyze email content to decide if we should respond, notify, or ignore.
 
@@ -35,68 +221,35 @@ def triage_router(state: State) -> Command[Literal["triage_interrupt_handler", "
     - Company-wide announcements
     - Messages meant for other teams
     """
+    # Bulk mail (newsletters, notification digests) is ignored without calling the router LLM
+    if is_bulk_email(state["email_input"]["email_thread"]):
+        return route_triage("ignore", state["email_input"])
+    messages = build_triage_messages(state["email_input"])
 
-    # Parse the email input
-    author, to, subject, email_thread = parse_email(state["email_input"])
-    user_prompt = triage_user_prompt.format(
-        author=author, to=to, subject=subject, email_thread=email_thread
-    )
+    # Run the router LLM, skipping the call if a similar email was already classified
+    result = get_llm_router().invoke(messages)
 
-    # Create email markdown for Agent Inbox in case of notification  
-    email_markdown = format_email_markdown(subject, author, to, email_thread)
+    return route_triage(result.classification, state["email_input"])
 
-    # Format system prompt with background and triage instructions
-    system_prompt = triage_system_prompt.format(
-        background=default_background,
-        triage_instructions=default_triage_instructions
-    )
+async def atriage_router(state: State) -> Command[Literal["triage_interrupt_handler", "response_agent", "__end__"]]:
+    """Async version of triage_router, so many emails can be triaged on one event loop."""
+    if is_bulk_email(state["email_input"]["email_thread"]):
+        return route_triage("ignore", state["email_input"])
+    result = await get_llm_router().ainvoke(build_triage_messages(state["email_input"]))
+    return route_triage(result.classification, state["email_input"])
 
-    # Run the router LLM
-    result = llm_router.invoke(
-        [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt},
-        ]
-    )
+async def triage_batch(states: list[State]) -> list[Command]:
+    """Triage several emails with concurrent router calls.
 
-    # Decision
-    classification = result.classification
-
-    # Process the classification decision
-    if classification == "respond":
-        print("📧 Classification: RESPOND - This email requires a response")
-        # Next node
-        goto = "response_agent"
-        # Update the state
-        update = {
-            "classification_decision": result.classification,
-            "messages": [{"role": "user",
-                            "content": f"Respond to the email: {email_markdown}"
-                        }],
-        }
-    elif classification == "ignore":
-        print("🚫 Classification: IGNORE - This email can be safely ignored")
+    Args:
+        states: States holding the email_input to triage
 
-        # Next node
-        goto = END
-        # Update the state
-        update = {
-            "classification_decision": classification,
-        }
-
-    elif classification == "notify":
-        print("🔔 Classification: NOTIFY - This email contains important information") 
-
-        # Next node
-        goto = "triage_interrupt_handler"
-        # Update the state
-        update = {
-            "classification_decision": classification,
-        }
-
-    else:
-        raise ValueError(f"Invalid classification: {classification}")
-    return Command(goto=goto, update=update)
+    Returns:
+        list[Command]: The triage decision for each state, in order
+    """
+    # All router calls are in flight at once, so the batch takes roughly one round-trip
+    # (bulk mail is filtered out by atriage_router before reaching the LLM)
+    return list(await asyncio.gather(*(atriage_router(state) for state in states)))
 
 def triage_interrupt_handler(state: State) -> Command[Literal["response_agent", "__end__"]]:
     """Handles interrupts from the triage step"""
@@ -104,7 +257,7 @@ def triage_interrupt_handler(state: State) -> Command[Literal["response_agent",
     # Parse the email input
     author, to, subject, email_thread = parse_email(state["email_input"])
 
-    # Create email markdown for Agent Inbox in case of notification  
+    # Create email markdown for the agent's history in case the user asks for a reply
     email_markdown = format_email_markdown(subject, author, to, email_thread)
 
     # Create messages
@@ -118,18 +271,15 @@ def triage_interrupt_handler(state: State) -> Command[Literal["response_agent",
             "action": f"Email Assistant: {state['classification_decision']}",
             "args": {}
         },
-        "config": {
-            "allow_ignore": True,  
-            "allow_respond": True, 
-            "allow_edit": False, 
-            "allow_accept": False,  
-        },
+        "config": INTERRUPT_CONFIGS["triage"],
         # Email to show in Agent Inbox
-        "description": email_markdown,
+        "description": state.get("email_preview") or email_preview_of(state["email_input"]),
     }
 
     # Agent Inbox responds with a list  
     response = interrupt([request])[0]
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Agent Inbox response: %r", response)
 
     # If user provides feedback, go to response agent and use feedback to respond to email   
     if response["type"] == "response":
@@ -157,24 +307,20 @@ def triage_interrupt_handler(state: State) -> Command[Literal["response_agent",
 
     return Command(goto=goto, update=update)
 
+def agent_messages(state: State) -> list:
+    """Agent LLM input: the system message followed by the conversation so far."""
+    return [AGENT_SYSTEM_MESSAGE, *state["messages"]]
+
 def llm_call(state: State):
     """LLM decides whether to call a tool or not"""
 
-    return {
-        "messages": [
-            llm_with_tools.invoke(
-                [
-                    {"role": "system", "content": agent_system_prompt_hitl.format(
-                        tools_prompt=HITL_TOOLS_PROMPT,
-                        background=default_background,
-                        response_preferences=default_response_preferences, 
-                        cal_preferences=default_cal_preferences
-                    )}
-                ]
-                + state["messages"]
-            )
-        ]
-    }
+    llm_with_tools = get_llm_with_tools()
+    return {"messages": [llm_with_tools.invoke(agent_messages(state))]}
+
+async def allm_call(state: State):
+    """Async version of llm_call, so ainvoke()/abatch() don't tie up a thread per LLM call."""
+    llm_with_tools = get_llm_with_tools()
+    return {"messages": [await llm_with_tools.ainvoke(agent_messages(state))]}
 
 def interrupt_handler(state: State) -> Command[Literal["llm_call", "__end__"]]:
     """Creates an interrupt for human review of tool calls"""
@@ -185,59 +331,43 @@ def interrupt_handler(state: State) -> Command[Literal["llm_call", "__end__"]]:
     # Go to the LLM call node next
     goto = "llm_call"
 
+    # Original email, shown above every tool call under review
+    original_email_markdown = state.get("email_preview") or email_preview_of(state["email_input"])
+
+    tool_calls = state["messages"][-1].tool_calls
+
+    # Tool messages of the calls outside the HITL list, whose tools run without interruption
+    # once all calls are reviewed: the node restarts from the top every time an interrupt is
+    # resumed, so running them up front would repeat them for every reviewed call
+    direct_messages = []
+
+    # Edited tool calls, applied to a single copy of the AI message once all calls are reviewed,
+    # so several edits of one message don't overwrite each other
+    edited_tool_calls = None
+
     # Iterate over the tool calls in the last message
-    for tool_call in state["messages"][-1].tool_calls:
-        
-        # Allowed tools for HITL
-        hitl_tools = ["write_email", "schedule_meeting", "Question"]
+    for index, tool_call in enumerate(tool_calls):
+        name, call_id = tool_call["name"], tool_call["id"]
         
-        # If tool is not in our HITL list, execute it directly without interruption
-        if tool_call["name"] not in hitl_tools:
-
-            # Execute search_memory and other tools without interruption
-            tool = tools_by_name[tool_call["name"]]
-            observation = tool.invoke(tool_call["args"])
-            result.append({"role": "tool", "content": observation, "tool_call_id": tool_call["id"]})
+        # If tool is not in our HITL list, it is executed after the loop without interruption
+        if name not in HITL_TOOL_NAMES:
+            result.append({"role": "tool", "content": None, "tool_call_id": call_id})
+            direct_messages.append((result[-1], tool_call))
             continue
             
-        # Get original email from email_input in state
-        email_input = state["email_input"]
-        author, to, subject, email_thread = parse_email(email_input)
-        original_email_markdown = format_email_markdown(subject, author, to, email_thread)
-        
         # Format tool call for display and prepend the original email
         tool_display = format_for_display(state, tool_call)
         description = original_email_markdown + tool_display
 
         # Configure what actions are allowed in Agent Inbox
-        if tool_call["name"] == "write_email":
-            config = {
-                "allow_ignore": True,
-                "allow_respond": True,
-                "allow_edit": True,
-                "allow_accept": True,
-            }
-        elif tool_call["name"] == "schedule_meeting":
-            config = {
-                "allow_ignore": True,
-                "allow_respond": True,
-                "allow_edit": True,
-                "allow_accept": True,
-            }
-        elif tool_call["name"] == "Question":
-            config = {
-                "allow_ignore": True,
-                "allow_respond": True,
-                "allow_edit": False,
-                "allow_accept": False,
-            }
-        else:
-            raise ValueError(f"Invalid tool call: {tool_call['name']}")
+        config = INTERRUPT_CONFIGS.get(name)
+        if config is None:
+            raise ValueError(f"Invalid tool call: {name}")
 
         # Create the interrupt request
         request = {
             "action_request": {
-                "action": tool_call["name"],
+                "action": name,
                 "args": tool_call["args"]
             },
             "config": config,
@@ -246,98 +376,70 @@ def interrupt_handler(state: State) -> Command[Literal["llm_call", "__end__"]]:
 
         # Send to Agent Inbox and wait for response
         response = interrupt([request])[0]
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Agent Inbox response for %s: %r", name, response)
 
         # Handle the responses 
         if response["type"] == "accept":
 
             # Execute the tool with original args
-            tool = tools_by_name[tool_call["name"]]
-            observation = tool.invoke(tool_call["args"])
-            result.append({"role": "tool", "content": observation, "tool_call_id": tool_call["id"]})
+            observation = run_tool(tool_call)
+            result.append({"role": "tool", "content": observation, "tool_call_id": call_id})
                         
         elif response["type"] == "edit":
 
-            # Tool selection 
-            tool = tools_by_name[tool_call["name"]]
-            
+            # Only drafts can be edited
+            if name not in EDITABLE_TOOL_NAMES:
+                raise ValueError(f"Invalid tool call: {name}")
+
             # Get edited args from Agent Inbox
             edited_args = response["args"]["args"]
 
-            # Update the AI message's tool call with edited content (reference to the message in the state)
-            ai_message = state["messages"][-1] # Get the most recent message from the state
-            current_id = tool_call["id"] # Store the ID of the tool call being edited
-            
-            # Create a new list of tool calls by filtering out the one being edited and adding the updated version
-            # This avoids modifying the original list directly (immutable approach)
-            updated_tool_calls = [tc for tc in ai_message.tool_calls if tc["id"] != current_id] + [
-                {"type": "tool_call", "name": tool_call["name"], "args": edited_args, "id": current_id}
-            ]
-
-            # Create a new copy of the message with updated tool calls rather than modifying the original
-            # This ensures state immutability and prevents side effects in other parts of the code
-            result.append(ai_message.model_copy(update={"tool_calls": updated_tool_calls}))
-
-            # Update the write_email tool call with the edited content from Agent Inbox
-            if tool_call["name"] == "write_email":
-                
-                # Execute the tool with edited args
-                observation = tool.invoke(edited_args)
-                
-                # Add only the tool response message
-                result.append({"role": "tool", "content": observation, "tool_call_id": current_id})
-            
-            # Update the schedule_meeting tool call with the edited content from Agent Inbox
-            elif tool_call["name"] == "schedule_meeting":
-                
-                
-                # Execute the tool with edited args
-                observation = tool.invoke(edited_args)
-                
-                # Add only the tool response message
-                result.append({"role": "tool", "content": observation, "tool_call_id": current_id})
-            
-            # Catch all other tool calls
-            else:
-                raise ValueError(f"Invalid tool call: {tool_call['name']}")
+            current_id = call_id # Store the ID of the tool call being edited
+
+            # Swap the edited call in at its original position, in the copy of the list of tool
+            # calls shared by all edits of this message (the original list isn't modified)
+            if edited_tool_calls is None:
+                edited_tool_calls = list(tool_calls)
+            edited_tool_calls[index] = {**tool_call, "args": edited_args}
+
+            # Execute the tool with edited args (validated, as they come from the user)
+            observation = tools_by_name[name].invoke(edited_args)
+
+            # Add only the tool response message
+            result.append({"role": "tool", "content": observation, "tool_call_id": current_id})
 
         elif response["type"] == "ignore":
-            if tool_call["name"] == "write_email":
-                # Don't execute the tool, and tell the agent how to proceed
-                result.append({"role": "tool", "content": "User ignored this email draft. Ignore this email and end the workflow.", "tool_call_id": tool_call["id"]})
-                # Go to END
-                goto = END
-            elif tool_call["name"] == "schedule_meeting":
-                # Don't execute the tool, and tell the agent how to proceed
-                result.append({"role": "tool", "content": "User ignored this calendar meeting draft. Ignore this email and end the workflow.", "tool_call_id": tool_call["id"]})
-                # Go to END
-                goto = END
-            elif tool_call["name"] == "Question":
-                # Don't execute the tool, and tell the agent how to proceed
-                result.append({"role": "tool", "content": "User ignored this question. Ignore this email and end the workflow.", "tool_call_id": tool_call["id"]})
-                # Go to END
-                goto = END
-            else:
-                raise ValueError(f"Invalid tool call: {tool_call['name']}")
-            
+            if name not in IGNORE_MESSAGES:
+                raise ValueError(f"Invalid tool call: {name}")
+            # Don't execute the tool, and tell the agent how to proceed
+            result.append({"role": "tool", "content": IGNORE_MESSAGES[name], "tool_call_id": call_id})
+            # Go to END
+            goto = END
+
         elif response["type"] == "response":
             # User provided feedback
-            user_feedback = response["args"]
-            if tool_call["name"] == "write_email":
-                # Don't execute the tool, and add a message with the user feedback to incorporate into the email
-                result.append({"role": "tool", "content": f"User gave feedback, which can we incorporate into the email. Feedback: {user_feedback}", "tool_call_id": tool_call["id"]})
-            elif tool_call["name"] == "schedule_meeting":
-                # Don't execute the tool, and add a message with the user feedback to incorporate into the email
-                result.append({"role": "tool", "content": f"User gave feedback, which can we incorporate into the meeting request. Feedback: {user_feedback}", "tool_call_id": tool_call["id"]})
-            elif tool_call["name"] == "Question":
-                # Don't execute the tool, and add a message with the user feedback to incorporate into the email
-                result.append({"role": "tool", "content": f"User answered the question, which can we can use for any follow up actions. Feedback: {user_feedback}", "tool_call_id": tool_call["id"]})
-            else:
-                raise ValueError(f"Invalid tool call: {tool_call['name']}")
+            if name not in RESPONSE_MESSAGES:
+                raise ValueError(f"Invalid tool call: {name}")
+            # Don't execute the tool, and add a message with the user feedback to incorporate
+            content = RESPONSE_MESSAGES[name].format(feedback=response["args"])
+            result.append({"role": "tool", "content": content, "tool_call_id": call_id})
 
         # Catch all other responses
         else:
             raise ValueError(f"Invalid response: {response}")
             
+    # The direct tool calls are independent (and mostly I/O-bound), so they run concurrently;
+    # repeated calls (e.g. the same day's availability checked twice) run once and share the result
+    unique_calls, indexes = dedupe_tool_calls([tool_call for _, tool_call in direct_messages])
+    observations = list(tool_executor.map(run_tool, unique_calls))
+    for (message, _), index in zip(direct_messages, indexes):
+        message["content"] = observations[index]
+
+    # Replace the AI message in the state with a copy carrying the edited tool calls
+    if edited_tool_calls is not None:
+        result.insert(0, state["messages"][-1].model_copy(update={"tool_calls": edited_tool_calls}))
+
     # Update the state 
     update = {
         "messages": result,
@@ -346,23 +448,50 @@ def interrupt_handler(state: State) -> Command[Literal["llm_call", "__end__"]]:
     return Command(goto=goto, update=update)
 
 # Conditional edge function
-def should_continue(state: State) -> Literal["interrupt_handler", "__end__"]:
-    """Route to tool handler, or end if Done tool called"""
+def should_continue(state: State) -> Literal["interrupt_handler", "auto_tools", "__end__"]:
+    """Route to tool handler (or straight to the tools if none needs review), or end if Done tool called."""
     messages = state["messages"]
     last_message = messages[-1]
-    if last_message.tool_calls:
-        for tool_call in last_message.tool_calls: 
-            if tool_call["name"] == "Done":
-                return END
-            else:
-                return "interrupt_handler"
+    # Only an explicit Done ends the run, and only when it is the sole call left, so a call
+    # issued next to it (e.g. a write_email) still gets reviewed and run
+    if last_message.tool_calls and all(tool_call["name"] == "Done" for tool_call in last_message.tool_calls):
+        return END
+    # Only tool calls that need human review go through the interrupt handler
+    if any(tool_call["name"] in HITL_TOOL_NAMES for tool_call in last_message.tool_calls):
+        return "interrupt_handler"
+    return "auto_tools"
+
+def auto_tools(state: State):
+    """Run tool calls that don't need human review, concurrently, and go back to the LLM."""
+    tool_calls = state["messages"][-1].tool_calls
+    # Identical calls in one turn run once, and each gets the shared result
+    unique_calls, indexes = dedupe_tool_calls(tool_calls)
+    observations = list(tool_executor.map(run_tool, unique_calls))
+    return {"messages": [
+        {"role": "tool", "content": observations[index], "tool_call_id": tool_call["id"]}
+        for tool_call, index in zip(tool_calls, indexes)
+    ]}
+
+async def aauto_tools(state: State):
+    """Async version of auto_tools, awaiting the tool threads instead of blocking the event loop."""
+    tool_calls = state["messages"][-1].tool_calls
+    unique_calls, indexes = dedupe_tool_calls(tool_calls)
+    loop = asyncio.get_running_loop()
+    observations = await asyncio.gather(
+        *(loop.run_in_executor(tool_executor, run_tool, tool_call) for tool_call in unique_calls)
+    )
+    return {"messages": [
+        {"role": "tool", "content": observations[index], "tool_call_id": tool_call["id"]}
+        for tool_call, index in zip(tool_calls, indexes)
+    ]}
 
 # Build workflow
 agent_builder = StateGraph(State)
 
 # Add nodes
-agent_builder.add_node("llm_call", llm_call)
+agent_builder.add_node("llm_call", RunnableLambda(llm_call, afunc=allm_call, name="llm_call"))
 agent_builder.add_node("interrupt_handler", interrupt_handler)
+agent_builder.add_node("auto_tools", RunnableLambda(auto_tools, afunc=aauto_tools, name="auto_tools"))
 
 # Add edges
 agent_builder.add_edge(START, "llm_call")
@@ -371,21 +500,26 @@ agent_builder.add_conditional_edges(
     should_continue,
     {
         "interrupt_handler": "interrupt_handler",
+        "auto_tools": "auto_tools",
         END: END,
     },
 )
+agent_builder.add_edge("auto_tools", "llm_call")
 
 # Compile the agent
 response_agent = agent_builder.compile()
 
+# One triage node for both call styles: invoke() runs triage_router and ainvoke()/abatch()
+# run atriage_router, so many emails can be triaged concurrently with the same graph
+triage_node = RunnableLambda(triage_router, afunc=atriage_router, name="triage_router")
+
 # Build overall workflow
 overall_workflow = (
     StateGraph(State, input=StateInput)
-    .add_node(triage_router)
+    .add_node("triage_router", triage_node, destinations=("triage_interrupt_handler", "response_agent", END))
     .add_node(triage_interrupt_handler)
     .add_node("response_agent", response_agent)
     .add_edge(START, "triage_router")
-    
 )
 
-email_assistant = overall_workflow.compile()
\ No newline at end of file
+email_assistant = overall_workflow.compile()
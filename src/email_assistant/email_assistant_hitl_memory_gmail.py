@@ -1,211 +1,210 @@
-import os
+import asyncio
+import functools
+import logging
 from typing import Literal
-from pydantic import BaseModel
+from types import MappingProxyType
 
-from langchain.chat_models import init_chat_model
+from langchain_core.runnables import RunnableLambda
+from langchain_core.runnables.config import ContextThreadPoolExecutor
+from langchain_core.utils.function_calling import convert_to_openai_tool
 
 from langgraph.graph import StateGraph, START, END
 from langgraph.store.base import BaseStore
 from langgraph.types import interrupt, Command
 
-from src.email_assistant.tools import get_tools, get_tools_by_name
+from src.email_assistant.tools import get_tools, get_tools_by_name, get_tool_runner, dedupe_tool_calls
 from src.email_assistant.tools.gmail.prompt_templates import GMAIL_TOOLS_PROMPT
 from src.email_assistant.tools.gmail.gmail_tools import mark_as_read
-from src.email_assistant.prompts import triage_system_prompt, triage_user_prompt, agent_system_prompt_hitl_memory, default_triage_instructions, default_background, default_response_preferences, default_cal_preferences
+from src.email_assistant.prompts import triage_system_prompt, triage_user_prompt, agent_system_prompt_hitl_memory_static, agent_preferences_prompt_hitl_memory, default_triage_instructions, default_background, default_response_preferences, default_cal_preferences
 from src.email_assistant.schemas import State, RouterSchema, StateInput
-from src.email_assistant.utils import parse_gmail, format_for_display, format_gmail_markdown
+from src.email_assistant.cache import CachingRouter, SemanticCache, get_llm_cache
+from src.email_assistant.batching import TriageBatcher
+from src.email_assistant.memory import get_memory, get_memories, aget_memories, submit_memory_update, submit_memory_updates, tool_feedback_messages, profile_for_prompt, TRIAGE_CACHE_NAMESPACE, triage_cache_ttl
+from src.email_assistant.utils import parse_gmail, format_for_display, format_gmail_markdown, triage_cache_key, store_node
 from dotenv import load_dotenv
 
 load_dotenv(".env")
 
-# Get tools with Gmail tools
-tools = get_tools(["send_email_tool", "schedule_meeting_tool", "check_calendar_tool", "Question", "Done"], include_gmail=True)
-tools_by_name = get_tools_by_name(tools)
-
-# Initialize the LLM for use with router / structured output
-llm = init_chat_model("openai:gpt-4.1", temperature=0.0)
-llm_router = llm.with_structured_output(RouterSchema) 
+logger = logging.getLogger(__name__)
 
-# Initialize the LLM, enforcing tool use (of any available tools) for agent
-llm = init_chat_model("openai:gpt-4.1", temperature=0.0)
-llm_with_tools = llm.bind_tools(tools, tool_choice="required")
-
-def get_memory(store, namespace, default_content=None):
-    """Get memory from the store or initialize with default if it doesn't exist.
-    
-    Args:
-        store: LangGraph BaseStore instance to search for existing memory
-        namespace: Tuple defining the memory namespace, e.g. ("email_assistant", "triage_preferences")
-        default_content: Default content to use if memory doesn't exist
-        
-    Returns:
-        str: The content of the memory profile, either from existing memory or the default
-    """
-    # Search for existing memory with namespace and key
-    user_preferences = store.get(namespace, "user_preferences")
-    
-    # If memory exists, return its content (the value)
-    if user_preferences:
-        return user_preferences.value
-    
-    # If memory doesn't exist, add it to the store and return the default content
-    else:
-        # Namespace, key, value
-        store.put(namespace, "user_preferences", default_content)
-        user_preferences = default_content
-    
-    # Return the default content
-    return user_preferences 
-
-class UserPreferences(BaseModel):
-    """User preferences."""
-    preferences: str
-    justification: str
-
-MEMORY_UPDATE_INSTRUCTIONS = """
-# Role and Objective
-You are a memory profile manager for an email assistant agent that selectively updates user preferences based on feedback messages from human-in-the-loop interactions with the email assistant.
-
-# Instructions
-- NEVER overwrite the entire memory profile
-- ONLY make targeted additions of new information
-- ONLY update specific facts that are directly contradicted by feedback messages
-- PRESERVE all other existing information in the profile
-- Format the profile consistently with the original style
-- Generate the profile as a string
-
-# Reasoning Steps
-1. Analyze the current memory profile structure and content
-2. Review feedback messages from human-in-the-loop interactions
-3. Extract relevant user preferences from these feedback messages (such as edits to emails/calendar invites, explicit feedback on assistant performance, user decisions to ignore certain emails)
-4. Compare new information against existing profile
-5. Identify only specific facts to add or update
-6. Preserve all other existing information
-7. Output the complete updated profile
-
-# Example
-<memory_profile>
-RESPOND:
-- wife
-- specific questions
-- system admin notifications
-NOTIFY: 
-- meeting invites
-IGNORE:
-- marketing emails
-- company-wide announcements
-- messages meant for other teams
-</memory_profile>
-
-<user_messages>
-"The assistant shouldn't have responded to that system admin notification."
-</user_messages>
-
-<updated_profile>
-RESPOND:
-- wife
-- specific questions
-NOTIFY: 
-- meeting invites
-- system admin notifications
-IGNORE:
-- marketing emails
-- company-wide announcements
-- messages meant for other teams
-</updated_profile>
-
-# Process current profile for {namespace}
-<memory_profile>
-{current_profile}
-</memory_profile>
-
-Think step by step about what specific feedback is being provided and what specific information should be added or updated in the profile while preserving everything else."""
-
-MEMORY_UPDATE_INSTRUCTIONS_REINFORCEMENT = """
-Remember:
-- NEVER overwrite the entire profile
-- ONLY make targeted additions or changes based on explicit feedback
-- PRESERVE all existing information not directly contradicted
-- Output the complete updated profile as a string
-"""
-
-def update_memory(store, namespace, messages):
-    """Update memory profile in the store.
-    
-    Args:
-        store: LangGraph BaseStore instance to update memory
-        namespace: Tuple defining the memory namespace, e.g. ("email_assistant", "triage_preferences")
-        messages: List of messages to update the memory with
+# Get tools with Gmail tools
+tools = tuple(get_tools(["send_email_tool", "schedule_meeting_tool", "check_calendar_tool", "Question", "Done"], include_gmail=True))
+# Read-only views: the tool set is fixed once the module is loaded
+tools_by_name = MappingProxyType(get_tools_by_name(tools))
+# Executes the agent's tool calls, calling the underlying functions directly
+run_tool = get_tool_runner(tools)
+
+# OpenAI schemas of the tools, converted once at import (before any worker fork) rather than
+# by bind_tools when the agent LLM is first built
+TOOL_SCHEMAS = tuple(convert_to_openai_tool(tool) for tool in tools)
+
+# Tools that need human review in Agent Inbox
+HITL_TOOL_NAMES = frozenset({"send_email_tool", "schedule_meeting_tool", "Question"})
+
+# Thread pool for tools that run without human review (copies the context so tracing still works)
+tool_executor = ContextThreadPoolExecutor(max_workers=4)
+
+# LLMs are built on first use (not at import), so loading the graph doesn't pay for the
+# provider SDK import and client setup, and a single chat model is shared
+@functools.cache
+def get_llm():
+    """Initialize the chat model shared by the router and the agent."""
+    from langchain.chat_models import init_chat_model
+    return init_chat_model("openai:gpt-4.1", temperature=0.0, cache=get_llm_cache())
+
+@functools.cache
+def get_llm_router():
+    """Router LLM with structured output for triage.
+
+    Near-duplicate emails (marketing blasts, recurring invites) reuse an earlier classification.
+    The cache is namespaced by the system prompt, so updated triage preferences start afresh.
+    Cache misses of emails triaged concurrently with ainvoke are classified in one LLM call.
+    The chat model cache is off for the router, so these caches (which forget_triage_decision
+    clears) are the only ones holding triage decisions.
     """
+    router_llm = get_llm().model_copy(update={"cache": False})
+    return CachingRouter(TriageBatcher(router_llm, RouterSchema), SemanticCache(threshold=0.95))
+
+# The agent's prompt prefix (tool schemas, then the static system prompt) is well over
+# OpenAI's 1024-token minimum for prompt caching. Tagging the calls with a shared cache key
+# routes them to the same cache, so the prefix is only prefilled once per burst of calls.
+AGENT_PROMPT_CACHE_KEY = "email_assistant_hitl_memory_gmail-agent"
+
+@functools.cache
+def get_llm_with_tools():
+    """Agent LLM bound to the tools, enforcing tool use."""
+    return get_llm().bind(tools=list(TOOL_SCHEMAS), tool_choice="required", prompt_cache_key=AGENT_PROMPT_CACHE_KEY)
+
+# The background never changes, so it is filled into the triage prompt once; only the triage
+# rules (a memory profile) are formatted in per email. Braces are escaped for the later format.
+TRIAGE_SYSTEM_PROMPT = triage_system_prompt.replace(
+    "{background}", default_background.replace("{", "{{").replace("}", "}}")
+)
 
-    # Get the existing memory
-    user_preferences = store.get(namespace, "user_preferences")
-    # Update the memory
-    llm = init_chat_model("openai:gpt-4.1", temperature=0.0).with_structured_output(UserPreferences)
-    result = llm.invoke(
-        [
-            {"role": "system", "content": MEMORY_UPDATE_INSTRUCTIONS.format(current_profile=user_preferences.value, namespace=namespace)},
-            {"role": "user", "content": f"Think carefully and update the memory profile based upon these user messages:"}
-        ] + messages
-    )
-    # Save the updated memory to the store
-    store.put(namespace, "user_preferences", result.preferences)
+# The static part of the agent's system prompt is built once; preferences are sent in a
+# second system message so memory updates don't change the prompt prefix
+AGENT_SYSTEM_MESSAGE = {"role": "system", "content": agent_system_prompt_hitl_memory_static.format(
+    tools_prompt=GMAIL_TOOLS_PROMPT,
+    background=default_background,
+)}
+
+# Actions allowed in Agent Inbox for each kind of interrupt. Requests share these dicts,
+# so they are built once here and must not be mutated
+INTERRUPT_CONFIGS = {
+    "triage": {
+        "allow_ignore": True,
+        "allow_respond": True,
+        "allow_edit": False,
+        "allow_accept": False,
+    },
+    "send_email_tool": {
+        "allow_ignore": True,
+        "allow_respond": True,
+        "allow_edit": True,
+        "allow_accept": True,
+    },
+    "schedule_meeting_tool": {
+        "allow_ignore": True,
+        "allow_respond": True,
+        "allow_edit": True,
+        "allow_accept": True,
+    },
+    "Question": {
+        "allow_ignore": True,
+        "allow_respond": True,
+        "allow_edit": False,
+        "allow_accept": False,
+    },
+}
+
+# Edits to a draft update the matching preferences: tool name -> (namespace, description of
+# the draft, short description)
+EDIT_FEEDBACK = {
+    "send_email_tool": (("email_assistant", "response_preferences"), "email response", "email"),
+    "schedule_meeting_tool": (("email_assistant", "cal_preferences"), "calendar invitation", "calendar invitation"),
+}
+
+# Ignoring a draft ends the workflow and updates the triage preferences:
+# tool name -> (message for the agent, explanation for the memory update)
+IGNORE_FEEDBACK = {
+    "send_email_tool": (
+        "User ignored this email draft. Ignore this email and end the workflow.",
+        "The user ignored the email draft. That means they did not want to respond to the email.",
+    ),
+    "schedule_meeting_tool": (
+        "User ignored this calendar meeting draft. Ignore this email and end the workflow.",
+        "The user ignored the calendar meeting draft. That means they did not want to schedule a meeting for this email.",
+    ),
+    "Question": (
+        "User ignored this question. Ignore this email and end the workflow.",
+        "The user ignored the Question. That means they did not want to answer the question or deal with this email.",
+    ),
+}
 
 # Nodes 
-def triage_router(state: State, store: BaseStore) -> Command[Literal["triage_interrupt_handler", "response_agent", "__end__"]]:
-    """Analyze email content to decide if we should respond, notify, or ignore.
+def email_markdown_of(state: State) -> str:
+    """Return the email as markdown, as stored in the state by the triage router.
 
-    The triage step prevents the assistant from wasting time on:
-    - Marketing emails and spam
-    - Company-wide announcements
-    - Messages meant for other teams
+    Later nodes reuse it instead of parsing and formatting the email again; it is only
+    rebuilt for states checkpointed before the field existed.
     """
-    
-    # Parse the email input
+    if state.get("email_markdown"):
+        return state["email_markdown"]
     author, to, subject, email_thread, email_id = parse_gmail(state["email_input"])
-    user_prompt = triage_user_prompt.format(
-        author=author, to=to, subject=subject, email_thread=email_thread
-    )
+    return format_gmail_markdown(subject, author, to, email_thread, email_id)
 
-    # Create email markdown for Agent Inbox in case of notification  
-    email_markdown = format_gmail_markdown(subject, author, to, email_thread, email_id)
+def forget_triage_decision(state: State, store: BaseStore) -> None:
+    """Drop the cached triage decisions for this email after the user overrode them.
 
-    # Search for existing triage_preferences memory
+    Otherwise the same email would be routed the same way again until the triage preferences
+    update (which runs in the background) changes the cache key: both the exact-match entry in
+    the store and the router's entries for similar emails are removed.
+    """
+    author, to, subject, email_thread, email_id = parse_gmail(state["email_input"])
     triage_instructions = get_memory(store, ("email_assistant", "triage_preferences"), default_triage_instructions)
-
-    # Format system prompt with background and triage instructions
-    system_prompt = triage_system_prompt.format(
-        background=default_background,
-        triage_instructions=triage_instructions,
+    store.delete(TRIAGE_CACHE_NAMESPACE, triage_cache_key(author, subject, email_thread, triage_instructions))
+    user_prompt = triage_user_prompt.format(
+        author=author, to=to, subject=subject, email_thread=email_thread
     )
-
-    # Run the router LLM
-    result = llm_router.invoke(
-        [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt},
-        ]
+    get_llm_router().forget(triage_messages(triage_instructions, user_prompt))
+
+# The system prompts only change when the preferences they are built from change, so each
+# version is formatted once and reused for every email
+@functools.lru_cache(maxsize=8)
+def triage_system_prompt_for(triage_instructions: str) -> str:
+    """Triage system prompt for the given triage preferences."""
+    return TRIAGE_SYSTEM_PROMPT.format(triage_instructions=profile_for_prompt(triage_instructions))
+
+@functools.lru_cache(maxsize=8)
+def agent_preferences_prompt_for(response_preferences: str, cal_preferences: str) -> str:
+    """Agent system prompt part holding the given response and calendar preferences."""
+    return agent_preferences_prompt_hitl_memory.format(
+        response_preferences=profile_for_prompt(response_preferences), 
+        cal_preferences=profile_for_prompt(cal_preferences)
     )
 
-    # Decision
-    classification = result.classification
+def triage_messages(triage_instructions: str, user_prompt: str) -> list[dict]:
+    """Router LLM input for an email, given the current triage preferences."""
+    return [
+        {"role": "system", "content": triage_system_prompt_for(triage_instructions)},
+        {"role": "user", "content": user_prompt},
+    ]
 
+def route_triage(classification: str, email_markdown: str) -> Command[Literal["triage_interrupt_handler", "response_agent", "__end__"]]:
+    """Turn the router's classification into the next step of the workflow."""
     # Process the classification decision
     if classification == "respond":
-        print("📧 Classification: RESPOND - This email requires a response")
         # Next node
         goto = "response_agent"
         # Update the state
         update = {
-            "classification_decision": result.classification,
+            "classification_decision": classification,
             "messages": [{"role": "user",
                             "content": f"Respond to the email: {email_markdown}"
                         }],
         }
         
     elif classification == "ignore":
-        print("🚫 Classification: IGNORE - This email can be safely ignored")
-
         # Next node
         goto = END
         # Update the state
@@ -214,8 +213,6 @@ def triage_router(state: State, store: BaseStore) -> Command[Literal["triage_int
         }
 
     elif classification == "notify":
-        print("🔔 Classification: NOTIFY - This email contains important information") 
-
         # Next node
         goto = "triage_interrupt_handler"
         # Update the state
@@ -225,18 +222,73 @@ def triage_router(state: State, store: BaseStore) -> Command[Literal["triage_int
 
     else:
         raise ValueError(f"Invalid classification: {classification}")
+    logger.info("Classification: %s", classification)
+
+    # Keep the formatted email for the interrupt handlers
+    update["email_markdown"] = email_markdown
     
     return Command(goto=goto, update=update)
 
-def triage_interrupt_handler(state: State, store: BaseStore) -> Command[Literal["response_agent", "__end__"]]:
-    """Handles interrupts from the triage step"""
-    
+def triage_router(state: State, store: BaseStore) -> Command[Literal["triage_interrupt_handler", "response_agent", "__end__"]]:
+    """Analyze email content to decide if we should respond, notify, or ignore.
+
+    The triage step prevents the assistant from wasting time on:
+    - Marketing emails and spam
+    - Company-wide announcements
+    - Messages meant for other teams
+    """
     # Parse the email input
     author, to, subject, email_thread, email_id = parse_gmail(state["email_input"])
+    user_prompt = triage_user_prompt.format(
+        author=author, to=to, subject=subject, email_thread=email_thread
+    )
 
     # Create email markdown for Agent Inbox in case of notification  
     email_markdown = format_gmail_markdown(subject, author, to, email_thread, email_id)
 
+    # Search for existing triage_preferences memory
+    triage_instructions = get_memory(store, ("email_assistant", "triage_preferences"), default_triage_instructions)
+
+    # Reuse the decision for an identical email classified under the same triage preferences
+    cache_key = triage_cache_key(author, subject, email_thread, triage_instructions)
+    cached = store.get(TRIAGE_CACHE_NAMESPACE, cache_key)
+    if cached:
+        classification = cached.value["classification"]
+    else:
+        # Run the router LLM
+        result = get_llm_router().invoke(triage_messages(triage_instructions, user_prompt))
+        classification = result.classification
+        store.put(TRIAGE_CACHE_NAMESPACE, cache_key, {"classification": classification}, ttl=triage_cache_ttl(store))
+
+    return route_triage(classification, email_markdown)
+
+async def atriage_router(state: State, store: BaseStore) -> Command[Literal["triage_interrupt_handler", "response_agent", "__end__"]]:
+    """Async version of triage_router, so many emails can be triaged on one event loop."""
+    author, to, subject, email_thread, email_id = parse_gmail(state["email_input"])
+    user_prompt = triage_user_prompt.format(
+        author=author, to=to, subject=subject, email_thread=email_thread
+    )
+    email_markdown = format_gmail_markdown(subject, author, to, email_thread, email_id)
+
+    (triage_instructions,) = await aget_memories(store, [(("email_assistant", "triage_preferences"), default_triage_instructions)])
+
+    cache_key = triage_cache_key(author, subject, email_thread, triage_instructions)
+    cached = await store.aget(TRIAGE_CACHE_NAMESPACE, cache_key)
+    if cached:
+        classification = cached.value["classification"]
+    else:
+        result = await get_llm_router().ainvoke(triage_messages(triage_instructions, user_prompt))
+        classification = result.classification
+        await store.aput(TRIAGE_CACHE_NAMESPACE, cache_key, {"classification": classification}, ttl=triage_cache_ttl(store))
+
+    return route_triage(classification, email_markdown)
+
+def triage_interrupt_handler(state: State, store: BaseStore) -> Command[Literal["response_agent", "__end__"]]:
+    """Handles interrupts from the triage step"""
+    
+    # Email markdown for Agent Inbox, as formatted by the triage router
+    email_markdown = email_markdown_of(state)
+
     # Create messages
     messages = [{"role": "user",
                 "content": f"Email to notify user about: {email_markdown}"
@@ -248,12 +300,7 @@ def triage_interrupt_handler(state: State, store: BaseStore) -> Command[Literal[
             "action": f"Email Assistant: {state['classification_decision']}",
             "args": {}
         },
-        "config": {
-            "allow_ignore": True,  
-            "allow_respond": True,
-            "allow_edit": False, 
-            "allow_accept": False,  
-        },
+        "config": INTERRUPT_CONFIGS["triage"],
         # Email to show in Agent Inbox
         "description": email_markdown,
     }
@@ -261,6 +308,9 @@ def triage_interrupt_handler(state: State, store: BaseStore) -> Command[Literal[
     # Send to Agent Inbox and wait for response
     response = interrupt([request])[0]
 
+    # Either way the user overrides the notify decision, so don't reuse it for this email
+    forget_triage_decision(state, store)
+
     # If user provides feedback, go to response agent and use feedback to respond to email   
     if response["type"] == "response":
         # Add feedback to messages 
@@ -269,7 +319,7 @@ def triage_interrupt_handler(state: State, store: BaseStore) -> Command[Literal[
                         "content": f"User wants to reply to the email. Use this feedback to respond: {user_input}"
                         })
         # Update memory with feedback
-        update_memory(store, ("email_assistant", "triage_preferences"), [{
+        submit_memory_update(store, ("email_assistant", "triage_preferences"), [{
             "role": "user",
             "content": f"The user decided to respond to the email, so update the triage preferences to capture this."
         }] + messages)
@@ -283,7 +333,7 @@ def triage_interrupt_handler(state: State, store: BaseStore) -> Command[Literal[
                         "content": f"The user decided to ignore the email even though it was classified as notify. Update triage preferences to capture this."
                         })
         # Update memory with feedback 
-        update_memory(store, ("email_assistant", "triage_preferences"), messages)
+        submit_memory_update(store, ("email_assistant", "triage_preferences"), messages)
         goto = END
 
     # Catch all other responses
@@ -297,30 +347,35 @@ def triage_interrupt_handler(state: State, store: BaseStore) -> Command[Literal[
 
     return Command(goto=goto, update=update)
 
+# Memory profiles the agent's prompt is built from, with their defaults
+AGENT_MEMORIES = [
+    (("email_assistant", "cal_preferences"), default_cal_preferences),
+    (("email_assistant", "response_preferences"), default_response_preferences),
+]
+
+def agent_messages(state: State, cal_preferences: str, response_preferences: str) -> list:
+    """Agent LLM input: the system messages followed by the conversation so far."""
+    return [
+        AGENT_SYSTEM_MESSAGE,
+        {"role": "system", "content": agent_preferences_prompt_for(response_preferences, cal_preferences)},
+        *state["messages"],
+    ]
+
 def llm_call(state: State, store: BaseStore):
     """LLM decides whether to call a tool or not"""
     
-    # Search for existing cal_preferences memory
-    cal_preferences = get_memory(store, ("email_assistant", "cal_preferences"), default_cal_preferences)
-    
-    # Search for existing response_preferences memory
-    response_preferences = get_memory(store, ("email_assistant", "response_preferences"), default_response_preferences)
-
-    return {
-        "messages": [
-            llm_with_tools.invoke(
-                [
-                    {"role": "system", "content": agent_system_prompt_hitl_memory.format(
-                        tools_prompt=GMAIL_TOOLS_PROMPT,
-                        background=default_background,
-                        response_preferences=response_preferences, 
-                        cal_preferences=cal_preferences
-                    )}
-                ]
-                + state["messages"]
-            )
-        ]
-    }
+    # Fetch the cal_preferences and response_preferences memories in one store round-trip
+    cal_preferences, response_preferences = get_memories(store, AGENT_MEMORIES)
+
+    llm_with_tools = get_llm_with_tools()
+    return {"messages": [llm_with_tools.invoke(agent_messages(state, cal_preferences, response_preferences))]}
+
+async def allm_call(state: State, store: BaseStore):
+    """Async version of llm_call."""
+    cal_preferences, response_preferences = await aget_memories(store, AGENT_MEMORIES)
+
+    llm_with_tools = get_llm_with_tools()
+    return {"messages": [await llm_with_tools.ainvoke(agent_messages(state, cal_preferences, response_preferences))]}
     
 def interrupt_handler(state: State, store: BaseStore) -> Command[Literal["llm_call", "__end__"]]:
     """Creates an interrupt for human review of tool calls"""
@@ -328,62 +383,51 @@ def interrupt_handler(state: State, store: BaseStore) -> Command[Literal["llm_ca
     # Store messages
     result = []
 
+    # Memory updates (namespace -> feedback messages), submitted once all tool calls are
+    # reviewed: the node re-runs from the top on every resume, so updates submitted inside
+    # the loop would be repeated for each earlier interrupt
+    memory_updates = {}
+
     # Go to the LLM call node next
     goto = "llm_call"
 
+    # Original email, as formatted by the triage router
+    original_email_markdown = email_markdown_of(state)
+
+    tool_calls = state["messages"][-1].tool_calls
+
+    # Tool messages of the calls outside the HITL list, whose tools run without interruption
+    # once all calls are reviewed: the node restarts from the top every time an interrupt is
+    # resumed, so running them up front would repeat them for every reviewed call
+    direct_messages = []
+
+    # Edited tool calls, applied to a single copy of the AI message once all calls are reviewed,
+    # so several edits of one message don't overwrite each other
+    edited_tool_calls = None
+
     # Iterate over the tool calls in the last message
-    for tool_call in state["messages"][-1].tool_calls:
-        
-        # Allowed tools for HITL
-        hitl_tools = ["send_email_tool", "schedule_meeting_tool", "Question"]
+    for index, tool_call in enumerate(tool_calls):
+        name, call_id = tool_call["name"], tool_call["id"]
         
-        # If tool is not in our HITL list, execute it directly without interruption
-        if tool_call["name"] not in hitl_tools:
-
-            # Execute search_memory and other tools without interruption
-            tool = tools_by_name[tool_call["name"]]
-            observation = tool.invoke(tool_call["args"])
-            result.append({"role": "tool", "content": observation, "tool_call_id": tool_call["id"]})
+        # If tool is not in our HITL list, it is executed after the loop without interruption
+        if name not in HITL_TOOL_NAMES:
+            result.append({"role": "tool", "content": None, "tool_call_id": call_id})
+            direct_messages.append((result[-1], tool_call))
             continue
             
-        # Get original email from email_input in state
-        email_input = state["email_input"]
-        author, to, subject, email_thread, email_id = parse_gmail(email_input)
-        original_email_markdown = format_gmail_markdown(subject, author, to, email_thread, email_id)
-        
         # Format tool call for display and prepend the original email
         tool_display = format_for_display(state, tool_call)
         description = original_email_markdown + tool_display
 
         # Configure what actions are allowed in Agent Inbox
-        if tool_call["name"] == "send_email_tool":
-            config = {
-                "allow_ignore": True,
-                "allow_respond": True,
-                "allow_edit": True,
-                "allow_accept": True,
-            }
-        elif tool_call["name"] == "schedule_meeting_tool":
-            config = {
-                "allow_ignore": True,
-                "allow_respond": True,
-                "allow_edit": True,
-                "allow_accept": True,
-            }
-        elif tool_call["name"] == "Question":
-            config = {
-                "allow_ignore": True,
-                "allow_respond": True,
-                "allow_edit": False,
-                "allow_accept": False,
-            }
-        else:
-            raise ValueError(f"Invalid tool call: {tool_call['name']}")
+        config = INTERRUPT_CONFIGS.get(name)
+        if config is None:
+            raise ValueError(f"Invalid tool call: {name}")
 
         # Create the interrupt request
         request = {
             "action_request": {
-                "action": tool_call["name"],
+                "action": name,
                 "args": tool_call["args"]
             },
             "config": config,
@@ -397,132 +441,102 @@ def interrupt_handler(state: State, store: BaseStore) -> Command[Literal["llm_ca
         if response["type"] == "accept":
 
             # Execute the tool with original args
-            tool = tools_by_name[tool_call["name"]]
-            observation = tool.invoke(tool_call["args"])
-            result.append({"role": "tool", "content": observation, "tool_call_id": tool_call["id"]})
+            observation = run_tool(tool_call)
+            result.append({"role": "tool", "content": observation, "tool_call_id": call_id})
                         
         elif response["type"] == "edit":
 
             # Tool selection 
-            tool = tools_by_name[tool_call["name"]]
+            tool = tools_by_name[name]
             initial_tool_call = tool_call["args"]
             
             # Get edited args from Agent Inbox
             edited_args = response["args"]["args"]
 
-            # Update the AI message's tool call with edited content (reference to the message in the state)
-            ai_message = state["messages"][-1] # Get the most recent message from the state
-            current_id = tool_call["id"] # Store the ID of the tool call being edited
-            
-            # Create a new list of tool calls by filtering out the one being edited and adding the updated version
-            # This avoids modifying the original list directly (immutable approach)
-            updated_tool_calls = [tc for tc in ai_message.tool_calls if tc["id"] != current_id] + [
-                {"type": "tool_call", "name": tool_call["name"], "args": edited_args, "id": current_id}
-            ]
-
-            # Create a new copy of the message with updated tool calls rather than modifying the original
-            # This ensures state immutability and prevents side effects in other parts of the code
-            result.append(ai_message.model_copy(update={"tool_calls": updated_tool_calls}))
-
-            # Save feedback in memory and update the write_email tool call with the edited content from Agent Inbox
-            if tool_call["name"] == "send_email_tool":
-                
-                # Execute the tool with edited args
-                observation = tool.invoke(edited_args)
-                
-                # Add only the tool response message
-                result.append({"role": "tool", "content": observation, "tool_call_id": current_id})
+            current_id = call_id # Store the ID of the tool call being edited
 
-                # This is new: update the memory
-                update_memory(store, ("email_assistant", "response_preferences"), [{
-                    "role": "user",
-                    "content": f"User edited the email response. Here is the initial email generated by the assistant: {initial_tool_call}. Here is the edited email: {edited_args}. Follow all instructions above, and remember: {MEMORY_UPDATE_INSTRUCTIONS_REINFORCEMENT}."
-                }])
-            
-            # Save feedback in memory and update the schedule_meeting tool call with the edited content from Agent Inbox
-            elif tool_call["name"] == "schedule_meeting_tool":
-                
-                # Execute the tool with edited args
-                observation = tool.invoke(edited_args)
-                
-                # Add only the tool response message
-                result.append({"role": "tool", "content": observation, "tool_call_id": current_id})
+            # Swap the edited call in at its original position, in the copy of the list of tool
+            # calls shared by all edits of this message (the original list isn't modified)
+            if edited_tool_calls is None:
+                edited_tool_calls = list(tool_calls)
+            edited_tool_calls[index] = {**tool_call, "args": edited_args}
 
-                # This is new: update the memory
-                update_memory(store, ("email_assistant", "cal_preferences"), [{
-                    "role": "user",
-                    "content": f"User edited the calendar invitation. Here is the initial calendar invitation generated by the assistant: {initial_tool_call}. Here is the edited calendar invitation: {edited_args}. Follow all instructions above, and remember: {MEMORY_UPDATE_INSTRUCTIONS_REINFORCEMENT}."
-                }])
-            
-            # Catch all other tool calls
-            else:
-                raise ValueError(f"Invalid tool call: {tool_call['name']}")
+            # Look up which memory profile the edit teaches us about
+            if name not in EDIT_FEEDBACK:
+                raise ValueError(f"Invalid tool call: {name}")
+            namespace, description, short_description = EDIT_FEEDBACK[name]
 
-        elif response["type"] == "ignore":
-
-            if tool_call["name"] == "send_email_tool":
-                # Don't execute the tool, and tell the agent how to proceed
-                result.append({"role": "tool", "content": "User ignored this email draft. Ignore this email and end the workflow.", "tool_call_id": tool_call["id"]})
-                # Go to END
-                goto = END
-                # This is new: update the memory
-                update_memory(store, ("email_assistant", "triage_preferences"), state["messages"] + result + [{
-                    "role": "user",
-                    "content": f"The user ignored the email draft. That means they did not want to respond to the email. Update the triage preferences to ensure emails of this type are not classified as respond. Follow all instructions above, and remember: {MEMORY_UPDATE_INSTRUCTIONS_REINFORCEMENT}."
-                }])
+            # Execute the tool with edited args
+            observation = tool.invoke(edited_args)
+            
+            # Add only the tool response message
+            result.append({"role": "tool", "content": observation, "tool_call_id": current_id})
 
-            elif tool_call["name"] == "schedule_meeting_tool":
-                # Don't execute the tool, and tell the agent how to proceed
-                result.append({"role": "tool", "content": "User ignored this calendar meeting draft. Ignore this email and end the workflow.", "tool_call_id": tool_call["id"]})
-                # Go to END
-                goto = END
-                # This is new: update the memory
-                update_memory(store, ("email_assistant", "triage_preferences"), state["messages"] + result + [{
-                    "role": "user",
-                    "content": f"The user ignored the calendar meeting draft. That means they did not want to schedule a meeting for this email. Update the triage preferences to ensure emails of this type are not classified as respond. Follow all instructions above, and remember: {MEMORY_UPDATE_INSTRUCTIONS_REINFORCEMENT}."
-                }])
+            # This is new: update the memory
+            memory_updates.setdefault(namespace, []).extend([{
+                "role": "user",
+                "content": f"User edited the {description}. Here is the initial {short_description} generated by the assistant: {initial_tool_call}. Here is the edited {short_description}: {edited_args}. Follow all instructions above."
+            }])
 
-            elif tool_call["name"] == "Question":
-                # Don't execute the tool, and tell the agent how to proceed
-                result.append({"role": "tool", "content": "User ignored this question. Ignore this email and end the workflow.", "tool_call_id": tool_call["id"]})
-                # Go to END
-                goto = END
-                # This is new: update the memory
-                update_memory(store, ("email_assistant", "triage_preferences"), state["messages"] + result + [{
-                    "role": "user",
-                    "content": f"The user ignored the Question. That means they did not want to answer the question or deal with this email. Update the triage preferences to ensure emails of this type are not classified as respond. Follow all instructions above, and remember: {MEMORY_UPDATE_INSTRUCTIONS_REINFORCEMENT}."
-                }])
+        elif response["type"] == "ignore":
 
-            else:
-                raise ValueError(f"Invalid tool call: {tool_call['name']}")
+            if name not in IGNORE_FEEDBACK:
+                raise ValueError(f"Invalid tool call: {name}")
+            tool_message, memory_message = IGNORE_FEEDBACK[name]
+
+            # Don't execute the tool, and tell the agent how to proceed
+            result.append({"role": "tool", "content": tool_message, "tool_call_id": call_id})
+            # Go to END
+            goto = END
+            # The email shouldn't have been classified as respond
+            forget_triage_decision(state, store)
+            # This is new: update the memory
+            memory_updates.setdefault(("email_assistant", "triage_preferences"), []).extend(tool_feedback_messages(original_email_markdown, tool_call, result[-1]["content"]) + [{
+                "role": "user",
+                "content": f"{memory_message} Update the triage preferences to ensure emails of this type are not classified as respond. Follow all instructions above."
+            }])
 
         elif response["type"] == "response":
             # User provided feedback
             user_feedback = response["args"]
-            if tool_call["name"] == "send_email_tool":
+            if name == "send_email_tool":
                 # Don't execute the tool, and add a message with the user feedback to incorporate into the email
-                result.append({"role": "tool", "content": f"User gave feedback, which can we incorporate into the email. Feedback: {user_feedback}", "tool_call_id": tool_call["id"]})
+                result.append({"role": "tool", "content": f"User gave feedback, which can we incorporate into the email. Feedback: {user_feedback}", "tool_call_id": call_id})
                 # This is new: update the memory
-                update_memory(store, ("email_assistant", "response_preferences"), state["messages"] + result + [{
+                memory_updates.setdefault(("email_assistant", "response_preferences"), []).extend(tool_feedback_messages(original_email_markdown, tool_call, result[-1]["content"]) + [{
                     "role": "user",
-                    "content": f"User gave feedback, which we can use to update the response preferences. Follow all instructions above, and remember: {MEMORY_UPDATE_INSTRUCTIONS_REINFORCEMENT}."
+                    "content": "User gave feedback, which we can use to update the response preferences. Follow all instructions above."
                 }])
 
-            elif tool_call["name"] == "schedule_meeting_tool":
+            elif name == "schedule_meeting_tool":
                 # Don't execute the tool, and add a message with the user feedback to incorporate into the email
-                result.append({"role": "tool", "content": f"User gave feedback, which can we incorporate into the meeting request. Feedback: {user_feedback}", "tool_call_id": tool_call["id"]})
+                result.append({"role": "tool", "content": f"User gave feedback, which can we incorporate into the meeting request. Feedback: {user_feedback}", "tool_call_id": call_id})
                 # This is new: update the memory
-                update_memory(store, ("email_assistant", "cal_preferences"), state["messages"] + result + [{
+                memory_updates.setdefault(("email_assistant", "cal_preferences"), []).extend(tool_feedback_messages(original_email_markdown, tool_call, result[-1]["content"]) + [{
                     "role": "user",
-                    "content": f"User gave feedback, which we can use to update the calendar preferences. Follow all instructions above, and remember: {MEMORY_UPDATE_INSTRUCTIONS_REINFORCEMENT}."
+                    "content": "User gave feedback, which we can use to update the calendar preferences. Follow all instructions above."
                 }])
 
-            elif tool_call["name"] == "Question":
+            elif name == "Question":
                 # Don't execute the tool, and add a message with the user feedback to incorporate into the email
-                result.append({"role": "tool", "content": f"User answered the question, which can we can use for any follow up actions. Feedback: {user_feedback}", "tool_call_id": tool_call["id"]})
+                result.append({"role": "tool", "content": f"User answered the question, which can we can use for any follow up actions. Feedback: {user_feedback}", "tool_call_id": call_id})
 
             else:
-                raise ValueError(f"Invalid tool call: {tool_call['name']}")
+                raise ValueError(f"Invalid tool call: {name}")
+
+    # The direct tool calls are independent (and mostly I/O-bound), so they run concurrently;
+    # repeated calls (e.g. the same day's availability checked twice) run once and share the result
+    unique_calls, indexes = dedupe_tool_calls([tool_call for _, tool_call in direct_messages])
+    observations = list(tool_executor.map(run_tool, unique_calls))
+    for (message, _), index in zip(direct_messages, indexes):
+        message["content"] = observations[index]
+
+    # Replace the AI message in the state with a copy carrying the edited tool calls
+    if edited_tool_calls is not None:
+        result.insert(0, state["messages"][-1].model_copy(update={"tool_calls": edited_tool_calls}))
+
+    # Update the memory profiles, with one memory LLM call if several of them changed
+    submit_memory_updates(store, memory_updates)
 
     # Update the state 
     update = {
@@ -532,17 +546,43 @@ def interrupt_handler(state: State, store: BaseStore) -> Command[Literal["llm_ca
     return Command(goto=goto, update=update)
 
 # Conditional edge function
-def should_continue(state: State, store: BaseStore) -> Literal["interrupt_handler", "mark_as_read_node"]:
-    """Route to tool handler, or end if Done tool called"""
+def should_continue(state: State, store: BaseStore) -> Literal["interrupt_handler", "auto_tools", "mark_as_read_node"]:
+    """Route to tool handler (or straight to the tools if none needs review), or end if Done tool called."""
     messages = state["messages"]
     last_message = messages[-1]
-    if last_message.tool_calls:
-        for tool_call in last_message.tool_calls: 
-            if tool_call["name"] == "Done":
-                # TODO: Here, we could update the background memory with the email-response for follow up actions. 
-                return "mark_as_read_node"
-            else:
-                return "interrupt_handler"
+    # Only an explicit Done ends the run, and only when it is the sole call left, so a call
+    # issued next to it (e.g. a write_email) still gets reviewed and run
+    if last_message.tool_calls and all(tool_call["name"] == "Done" for tool_call in last_message.tool_calls):
+        # TODO: Here, we could update the background memory with the email-response for follow up actions. 
+        return "mark_as_read_node"
+    # Only tool calls that need human review go through the interrupt handler
+    if any(tool_call["name"] in HITL_TOOL_NAMES for tool_call in last_message.tool_calls):
+        return "interrupt_handler"
+    return "auto_tools"
+
+def auto_tools(state: State):
+    """Run tool calls that don't need human review, concurrently, and go back to the LLM."""
+    tool_calls = state["messages"][-1].tool_calls
+    # Identical calls in one turn run once, and each gets the shared result
+    unique_calls, indexes = dedupe_tool_calls(tool_calls)
+    observations = list(tool_executor.map(run_tool, unique_calls))
+    return {"messages": [
+        {"role": "tool", "content": observations[index], "tool_call_id": tool_call["id"]}
+        for tool_call, index in zip(tool_calls, indexes)
+    ]}
+
+async def aauto_tools(state: State):
+    """Async version of auto_tools, awaiting the tool threads instead of blocking the event loop."""
+    tool_calls = state["messages"][-1].tool_calls
+    unique_calls, indexes = dedupe_tool_calls(tool_calls)
+    loop = asyncio.get_running_loop()
+    observations = await asyncio.gather(
+        *(loop.run_in_executor(tool_executor, run_tool, tool_call) for tool_call in unique_calls)
+    )
+    return {"messages": [
+        {"role": "tool", "content": observations[index], "tool_call_id": tool_call["id"]}
+        for tool_call, index in zip(tool_calls, indexes)
+    ]}
 
 def mark_as_read_node(state: State):
     email_input = state["email_input"]
@@ -552,9 +592,10 @@ def mark_as_read_node(state: State):
 # Build workflow
 agent_builder = StateGraph(State)
 
-# Add nodes - with store parameter
-agent_builder.add_node("llm_call", llm_call)
+# Add nodes - with store parameter. invoke() runs llm_call and ainvoke() runs allm_call
+agent_builder.add_node("llm_call", store_node(llm_call, allm_call))
 agent_builder.add_node("interrupt_handler", interrupt_handler)
+agent_builder.add_node("auto_tools", RunnableLambda(auto_tools, afunc=aauto_tools, name="auto_tools"))
 agent_builder.add_node("mark_as_read_node", mark_as_read_node)
 
 # Add edges
@@ -564,9 +605,11 @@ agent_builder.add_conditional_edges(
     should_continue,
     {
         "interrupt_handler": "interrupt_handler",
+        "auto_tools": "auto_tools",
         "mark_as_read_node": "mark_as_read_node",
     },
 )
+agent_builder.add_edge("auto_tools", "llm_call")
 agent_builder.add_edge("mark_as_read_node", END)
 
 # Compile the agent
@@ -575,7 +618,7 @@ response_agent = agent_builder.compile()
 # Build overall workflow with store and checkpointer
 overall_workflow = (
     StateGraph(State, input=StateInput)
-    .add_node(triage_router)
+    .add_node("triage_router", store_node(triage_router, atriage_router), destinations=("triage_interrupt_handler", "response_agent", END))
     .add_node(triage_interrupt_handler)
     .add_node("response_agent", response_agent)
     .add_node("mark_as_read_node", mark_as_read_node)
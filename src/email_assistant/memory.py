@@ -0,0 +1,744 @@
+"""Memory profiles (user preferences) shared by the memory-enabled email assistants."""
+
+import asyncio
+import atexit
+import functools
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+import weakref
+from collections import OrderedDict, defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+
+from langchain_core.messages import convert_to_openai_messages
+from langgraph.store.base import BaseStore, GetOp, PutOp
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+# Memory profiles read within this many seconds are served from the in-process cache. A graph
+# run reads the same profiles on every triage/llm_call step; after a human-in-the-loop pause
+# the entries have expired and the profiles are read from the store again.
+MEMORY_CACHE_TTL = 60.0
+
+# At most this many profiles are cached per store; the least recently read ones are dropped
+# first. Only matters when namespaces are per user, e.g. one set of profiles per mailbox.
+MEMORY_CACHE_MAXSIZE = 256
+
+# store -> {namespace: (profile, expiry)} in least-recently-used order; weak so a discarded
+# store takes its cache with it
+_memory_cache: "weakref.WeakKeyDictionary[BaseStore, OrderedDict[tuple, tuple[str, float]]]" = weakref.WeakKeyDictionary()
+
+def _cache_for(store) -> OrderedDict:
+    """Return the profile cache for a store, creating it on first use."""
+    try:
+        return _memory_cache.setdefault(store, OrderedDict())
+    except TypeError:
+        # Store can't be weakly referenced, so don't cache its profiles
+        return OrderedDict()
+
+def _cache_get(cache: OrderedDict, namespace, now: float):
+    """Return a cached profile that hasn't expired, or None."""
+    cached = cache.get(namespace)
+    if cached is None or cached[1] <= now:
+        return None
+    cache.move_to_end(namespace)
+    return cached[0]
+
+def _cache_put(cache: OrderedDict, namespace, profile) -> None:
+    """Cache a profile, dropping the least recently used ones beyond MEMORY_CACHE_MAXSIZE."""
+    cache[namespace] = (profile, time.monotonic() + MEMORY_CACHE_TTL)
+    cache.move_to_end(namespace)
+    while len(cache) > MEMORY_CACHE_MAXSIZE:
+        cache.popitem(last=False)
+
+def invalidate_memory(store, namespace=None) -> None:
+    """Drop cached profiles so the next read goes to the store.
+
+    Call this after writing profiles to the store directly (not through update_memory),
+    e.g. when seeding or resetting preferences in a notebook.
+
+    Args:
+        store: LangGraph BaseStore instance the profiles were cached for
+        namespace: Namespace to drop, or None to drop every profile cached for the store
+    """
+    cache = _cache_for(store)
+    if namespace is None:
+        cache.clear()
+    else:
+        cache.pop(namespace, None)
+
+def get_memory(store, namespace, default_content=None):
+    """Get memory from the store or initialize with default if it doesn't exist.
+    
+    Recently read profiles are served from an in-process cache (see MEMORY_CACHE_TTL), so
+    the repeated lookups of one graph run cost a single store round-trip per namespace.
+
+    Args:
+        store: LangGraph BaseStore instance to search for existing memory
+        namespace: Tuple defining the memory namespace, e.g. ("email_assistant", "triage_preferences")
+        default_content: Default content to use if memory doesn't exist
+        
+    Returns:
+        str: The content of the memory profile, either from existing memory or the default
+    """
+    cache = _cache_for(store)
+    cached = _cache_get(cache, namespace, time.monotonic())
+    if cached is not None:
+        return cached
+
+    # Search for existing memory with namespace and key
+    user_preferences = store.get(namespace, "user_preferences")
+    
+    # If memory exists, return its content (the value)
+    if user_preferences:
+        user_preferences = user_preferences.value
+    
+    # If memory doesn't exist, add it to the store and return the default content
+    else:
+        user_preferences = _seed_defaults(store, [(namespace, default_content)])[namespace]
+    
+    _cache_put(cache, namespace, user_preferences)
+    return user_preferences 
+
+def get_memories(store, requests):
+    """Get several memory profiles with a single store round-trip.
+
+    Same behavior as calling get_memory for each namespace, but profiles missing from the
+    cache are fetched with one store.batch call.
+
+    Args:
+        store: LangGraph BaseStore instance to search for existing memory
+        requests: List of (namespace, default_content) tuples
+
+    Returns:
+        list[str]: The content of each memory profile, in the order requested
+    """
+    cache, profiles, misses = _cached_profiles(store, requests)
+    if misses:
+        items = store.batch([GetOp(namespace, "user_preferences") for namespace, _ in misses])
+        # Initialize profiles that don't exist yet with their defaults
+        missing = _missing_profiles(misses, items)
+        seeded = _seed_defaults(store, missing) if missing else {}
+        _cache_fetched(cache, profiles, misses, items, seeded)
+
+    return [profiles[namespace] for namespace, _ in requests]
+
+async def aget_memories(store, requests):
+    """Async version of get_memories, using the store's async batch API."""
+    cache, profiles, misses = _cached_profiles(store, requests)
+    if misses:
+        items = await store.abatch([GetOp(namespace, "user_preferences") for namespace, _ in misses])
+        missing = _missing_profiles(misses, items)
+        # Seeding takes the (thread) namespace locks, so it runs off the event loop; it only
+        # happens the first time a profile is read
+        seeded = await asyncio.to_thread(_seed_defaults, store, missing) if missing else {}
+        _cache_fetched(cache, profiles, misses, items, seeded)
+
+    return [profiles[namespace] for namespace, _ in requests]
+
+def _cached_profiles(store, requests):
+    """Split requested profiles into cache hits and the (namespace, default) pairs to fetch."""
+    cache = _cache_for(store)
+    now = time.monotonic()
+    profiles = {}
+    for namespace, _ in requests:
+        cached = _cache_get(cache, namespace, now)
+        if cached is not None:
+            profiles[namespace] = cached
+
+    misses = [(namespace, default) for namespace, default in requests if namespace not in profiles]
+    return cache, profiles, misses
+
+def _missing_profiles(misses, items):
+    """Return the (namespace, default) pairs of the fetched profiles that don't exist yet."""
+    return [(namespace, default) for (namespace, default), item in zip(misses, items) if not item]
+
+def _seed_defaults(store, missing):
+    """Initialize profiles that don't exist yet with their defaults.
+
+    Each profile is read again while holding its namespace's update lock, so a default never
+    overwrites a profile that a memory update saved after the first read missed it, and
+    concurrent first reads write the default once.
+
+    Args:
+        store: LangGraph BaseStore instance holding the profiles
+        missing: List of (namespace, default_content) pairs whose profile wasn't found
+
+    Returns:
+        dict: namespace -> the profile now in the store
+    """
+    profiles = {}
+    for namespace, default in missing:
+        with _namespace_locks_guard:
+            lock = _namespace_locks[namespace]
+        with lock:
+            item = store.get(namespace, "user_preferences")
+            if item:
+                profiles[namespace] = item.value
+            else:
+                store.put(namespace, "user_preferences", default)
+                profiles[namespace] = default
+    return profiles
+
+def _cache_fetched(cache, profiles, misses, items, seeded):
+    """Record fetched (or just seeded) profiles in profiles and the cache."""
+    for (namespace, _), item in zip(misses, items):
+        profiles[namespace] = item.value if item else seeded[namespace]
+        _cache_put(cache, namespace, profiles[namespace])
+
+# Profiles are inserted into the triage and agent prompts, and they only grow as feedback is
+# added, so the part sent with each prompt is capped (roughly 1k tokens) to keep prompt size
+# bounded. Updates still see and rewrite the whole profile.
+PROFILE_PROMPT_MAX_CHARS = 4000
+
+def profile_for_prompt(profile: str) -> str:
+    """Cap a memory profile to PROFILE_PROMPT_MAX_CHARS for use in a prompt.
+
+    Args:
+        profile: The profile as stored
+
+    Returns:
+        str: The profile, cut at the last line break within the limit if it is too long
+    """
+    if len(profile) <= PROFILE_PROMPT_MAX_CHARS:
+        return profile
+    cut = profile.rfind("\n", 0, PROFILE_PROMPT_MAX_CHARS)
+    logger.warning("Memory profile of %d characters truncated for the prompt", len(profile))
+    return profile[: cut if cut > 0 else PROFILE_PROMPT_MAX_CHARS]
+
+class UserPreferences(BaseModel):
+    """User preferences."""
+    preferences: str
+    justification: str
+
+class CombinedPreferences(BaseModel):
+    """Updated user preferences for several memory profiles. Profiles that were not asked for are null."""
+    triage_preferences: str | None
+    response_preferences: str | None
+    cal_preferences: str | None
+    justification: str
+
+# Profiles (by the last element of their namespace) that update_memories can update together
+COMBINED_PROFILES = frozenset({"triage_preferences", "response_preferences", "cal_preferences"})
+
+# Guide shared by every memory update prompt. The namespace and current profile always come
+# after it, so all updates (single or combined, any namespace) start with the same prefix and
+# OpenAI's automatic prompt caching can reuse it. Caching only applies to prompts of at least
+# 1024 tokens (gpt-4.1), so keep the guide itself around that size.
+MEMORY_UPDATE_GUIDE = """
+# Role and Objective
+You are a memory profile manager for an email assistant agent that selectively updates user preferences based on feedback messages from human-in-the-loop interactions with the email assistant.
+
+# Instructions
+- NEVER overwrite the entire memory profile
+- ONLY make targeted additions of new information
+- ONLY update specific facts that are directly contradicted by feedback messages
+- PRESERVE all other existing information in the profile
+- Format the profile consistently with the original style
+- Generate the profile as a string
+
+# Reasoning Steps
+1. Analyze the current memory profile structure and content
+2. Review feedback messages from human-in-the-loop interactions
+3. Extract relevant user preferences from these feedback messages (such as edits to emails/calendar invites, explicit feedback on assistant performance, user decisions to ignore certain emails)
+4. Compare new information against existing profile
+5. Identify only specific facts to add or update
+6. Preserve all other existing information
+7. Output the complete updated profile
+
+# Examples
+
+## Triage preferences
+<memory_profile>
+RESPOND:
+- wife
+- specific questions
+- system admin notifications
+NOTIFY: 
+- meeting invites
+IGNORE:
+- marketing emails
+- company-wide announcements
+- messages meant for other teams
+</memory_profile>
+
+<user_messages>
+"The assistant shouldn't have responded to that system admin notification."
+</user_messages>
+
+<updated_profile>
+RESPOND:
+- wife
+- specific questions
+NOTIFY: 
+- meeting invites
+- system admin notifications
+IGNORE:
+- marketing emails
+- company-wide announcements
+- messages meant for other teams
+</updated_profile>
+
+## Response preferences
+<memory_profile>
+Use professional and concise language.
+
+When responding to meeting scheduling requests:
+- Mention the meeting duration in your response to confirm you've noted it correctly.
+</memory_profile>
+
+<user_messages>
+"User edited the email response. Here is the initial email generated by the assistant: 'Dear Alice, thank you for reaching out. I would be delighted to meet next week to discuss the project. Please let me know which time suits you best. Kind regards, Lance'. Here is the edited email: 'Hi Alice, happy to meet next week. Does Tuesday at 2pm work? Lance'."
+</user_messages>
+
+<updated_profile>
+Use professional and concise language. Keep emails short and informal: greet with "Hi <name>", skip pleasantries, and sign off with just the first name.
+
+When responding to meeting scheduling requests:
+- Mention the meeting duration in your response to confirm you've noted it correctly.
+- Propose a specific day and time rather than asking the sender to choose.
+</updated_profile>
+
+## Calendar preferences
+<memory_profile>
+30 minute meetings are preferred, but 15 minute meetings are also acceptable.
+</memory_profile>
+
+<user_messages>
+"User edited the calendar invitation. Here is the initial calendar invitation generated by the assistant: a 30 minute meeting at 9:00 AM on Monday. Here is the edited calendar invitation: a 30 minute meeting at 2:00 PM on Monday."
+"User gave feedback, which we can use to update the calendar preferences: don't book meetings before 10am."
+</user_messages>
+
+<updated_profile>
+30 minute meetings are preferred, but 15 minute meetings are also acceptable.
+Don't schedule meetings before 10:00 AM; prefer early afternoon slots.
+</updated_profile>
+
+Note how each update keeps every existing line and only adds (or rewrites) the lines the feedback is about. Feedback about one kind of preference (e.g. the tone of an email) never changes a different profile.
+
+# Output
+- preferences: the complete updated profile, in the same format as the current profile
+- justification: one or two sentences on what was added or changed and which feedback it came from
+"""
+
+MEMORY_UPDATE_INSTRUCTIONS = MEMORY_UPDATE_GUIDE + """
+# Process current profile for {namespace}
+<memory_profile>
+{current_profile}
+</memory_profile>
+
+Think step by step about what specific feedback is being provided and what specific information should be added or updated in the profile while preserving everything else."""
+
+def tool_feedback_messages(email_markdown: str, tool_call: dict, outcome: str) -> list[dict]:
+    """Context for a memory update about one reviewed tool call.
+
+    The memory LLM only needs the email, the proposed tool call and what the user did with it,
+    not the agent's whole conversation.
+
+    Args:
+        email_markdown: The email the agent was handling
+        tool_call: The tool call the user reviewed
+        outcome: What happened to the tool call, e.g. the message sent back to the agent
+
+    Returns:
+        list[dict]: Messages to pass to update_memory, before the update instruction
+    """
+    return [
+        {"role": "user", "content": f"Email: {email_markdown}"},
+        {"role": "assistant", "content": f"Proposed {tool_call['name']} call with arguments: {tool_call['args']}"},
+        {"role": "user", "content": outcome},
+    ]
+
+@functools.cache
+def get_memory_chat_model():
+    """Chat model shared by the memory LLMs, created on first use."""
+    from langchain.chat_models import init_chat_model
+    return init_chat_model("openai:gpt-4.1", temperature=0.0)
+
+@functools.cache
+def get_memory_llm():
+    """LLM used to update memory profiles, created once and reused across updates."""
+    # Strict JSON-schema decoding guarantees a valid UserPreferences, so callers don't need
+    # to repeat formatting reminders in their messages
+    return get_memory_chat_model().with_structured_output(
+        UserPreferences, method="json_schema", strict=True
+    )
+
+@functools.cache
+def get_combined_memory_llm():
+    """LLM used to update several memory profiles in one call."""
+    return get_memory_chat_model().with_structured_output(
+        CombinedPreferences, method="json_schema", strict=True
+    )
+
+def update_memory(store, namespace, messages):
+    """Update memory profile in the store.
+    
+    Args:
+        store: LangGraph BaseStore instance to update memory
+        namespace: Tuple defining the memory namespace, e.g. ("email_assistant", "triage_preferences")
+        messages: List of messages to update the memory with
+    """
+    # Get the existing memory
+    user_preferences = store.get(namespace, "user_preferences")
+    # Update the memory
+    result = get_memory_llm().invoke(memory_update_prompt(namespace, user_preferences.value, messages))
+    _save_profile(store, namespace, result.preferences)
+
+def memory_update_prompt(namespace, current_profile, messages):
+    """Messages asking the memory LLM to update a profile.
+
+    Args:
+        namespace: Tuple defining the memory namespace
+        current_profile: The profile as currently stored
+        messages: List of messages to update the memory with
+
+    Returns:
+        list: System and instruction messages followed by the feedback messages
+    """
+    return [
+        {"role": "system", "content": MEMORY_UPDATE_INSTRUCTIONS.format(current_profile=current_profile, namespace=namespace)},
+        {"role": "user", "content": "Think carefully and update the memory profile based upon these user messages:"}
+    ] + messages
+
+def update_memories(store, updates):
+    """Update several memory profiles with a single memory LLM call.
+
+    Args:
+        store: LangGraph BaseStore instance to update memory
+        updates: Dict of namespace -> list of messages to update that profile with
+    """
+    if len(updates) == 1 or any(namespace[-1] not in COMBINED_PROFILES for namespace in updates):
+        for namespace, messages in updates.items():
+            update_memory(store, namespace, messages)
+        return
+
+    namespaces = list(updates)
+    current = store.batch([GetOp(namespace, "user_preferences") for namespace in namespaces])
+    result = get_combined_memory_llm().invoke(
+        combined_memory_update_prompt({namespace: item.value for namespace, item in zip(namespaces, current)}, updates)
+    )
+    for namespace in namespaces:
+        profile = getattr(result, namespace[-1])
+        if profile is None:
+            logger.error("Combined memory update returned no profile for %s", namespace)
+            continue
+        _save_profile(store, namespace, profile)
+
+def combined_memory_update_prompt(current_profiles, updates):
+    """Messages asking the memory LLM to update several profiles at once.
+
+    Args:
+        current_profiles: Dict of namespace -> the profile as currently stored
+        updates: Dict of namespace -> messages to update that profile with
+
+    Returns:
+        list: System message with every profile, then the feedback for each profile in turn
+    """
+    profiles = "".join(
+        f"\n# Process current profile for {namespace} (field {namespace[-1]})\n<memory_profile>\n{profile}\n</memory_profile>\n"
+        for namespace, profile in current_profiles.items()
+    )
+    system = (MEMORY_UPDATE_GUIDE + profiles
+              + "\nUpdate each of these profiles using only the feedback given for it, and leave the fields of all other profiles null. "
+              "Think step by step about what specific feedback is being provided and what specific information should be added or updated in each profile while preserving everything else.")
+    messages = [{"role": "system", "content": system}]
+    for namespace, feedback in updates.items():
+        messages.append({"role": "user", "content": f"Think carefully and update the {namespace[-1]} profile based upon these user messages:"})
+        messages.extend(feedback)
+    return messages
+
+# Store namespace of the memory graphs' past triage decisions, keyed by triage_cache_key (the
+# email plus the triage preferences it was classified under)
+TRIAGE_CACHE_NAMESPACE = ("email_assistant", "triage_cache")
+# Minutes a triage decision is kept, on stores that support TTLs
+TRIAGE_CACHE_TTL = 7 * 24 * 60
+
+def triage_cache_ttl(store):
+    """TTL to save a triage decision with: None (no expiry) if the store doesn't support TTLs."""
+    return TRIAGE_CACHE_TTL if store.supports_ttl else None
+
+def clear_triage_cache(store) -> None:
+    """Delete every cached triage decision.
+
+    Decisions are keyed by the triage preferences, so once those are updated none of the
+    existing entries can be read again; without this they would stay in the store forever.
+    """
+    while items := store.search(TRIAGE_CACHE_NAMESPACE, limit=100):
+        store.batch([PutOp(TRIAGE_CACHE_NAMESPACE, item.key, None) for item in items])
+
+def _save_profile(store, namespace, profile):
+    """Save an updated profile to the store, and to the cache so later reads see it."""
+    store.put(namespace, "user_preferences", profile)
+    _cache_put(_cache_for(store), namespace, profile)
+    if namespace[-1] == "triage_preferences":
+        clear_triage_cache(store)
+
+# Memory updates run on a small thread pool so the interrupt handlers don't wait for the
+# memory LLM. Updates to the same namespace are serialized so none of them is lost, and
+# updates submitted while another one for the namespace is still queued are merged into it,
+# so a burst of feedback costs one memory LLM call.
+# (The executor's worker threads are joined at interpreter exit, so queued updates still
+# complete when a script ends.)
+_memory_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="memory-update")
+_namespace_locks: defaultdict[tuple, threading.Lock] = defaultdict(threading.Lock)
+_namespace_locks_guard = threading.Lock()
+_pending_updates: set[Future] = set()
+# (id(store), namespace) -> (messages of the queued update, its future)
+_queued_updates: dict[tuple, tuple[list, Future]] = {}
+
+def _run_queued_update(store, namespace):
+    """Run the queued update for a namespace while holding the namespace's lock."""
+    key = (id(store), namespace)
+    with _namespace_locks_guard:
+        lock = _namespace_locks[namespace]
+    with lock:
+        # Take the messages collected so far; later submissions start a new queued update
+        with _namespace_locks_guard:
+            messages, _ = _queued_updates.pop(key)
+        update_memory(store, namespace, messages)
+
+def _update_done(future: Future) -> None:
+    """Forget a finished update and log it if it failed."""
+    _pending_updates.discard(future)
+    if not future.cancelled() and future.exception() is not None:
+        logger.error("Memory update failed", exc_info=future.exception())
+
+def submit_memory_update(store, namespace, messages) -> Future:
+    """Update a memory profile in the background.
+
+    Args:
+        store: LangGraph BaseStore instance to update memory
+        namespace: Tuple defining the memory namespace, e.g. ("email_assistant", "triage_preferences")
+        messages: List of messages to update the memory with
+
+    Returns:
+        Future: Completes when the profile has been saved
+    """
+    if BATCH_MODE:
+        return queue_batch_memory_update(store, namespace, messages)
+
+    key = (id(store), namespace)
+    with _namespace_locks_guard:
+        # Merge into an update for this namespace that hasn't started yet
+        if key in _queued_updates:
+            queued_messages, future = _queued_updates[key]
+            queued_messages.extend(messages)
+            return future
+        future = _memory_executor.submit(_run_queued_update, store, namespace)
+        _queued_updates[key] = (list(messages), future)
+        _pending_updates.add(future)
+    future.add_done_callback(_update_done)
+    return future
+
+def submit_memory_updates(store, updates) -> Future | None:
+    """Update several memory profiles in the background, with one memory LLM call if possible.
+
+    Args:
+        store: LangGraph BaseStore instance to update memory
+        updates: Dict of namespace -> list of messages to update that profile with
+
+    Returns:
+        Future: Completes when the profiles have been saved, or None if there were no updates
+    """
+    if len(updates) <= 1 or BATCH_MODE:
+        futures = [submit_memory_update(store, namespace, messages) for namespace, messages in updates.items()]
+        return futures[0] if futures else None
+
+    updates = {namespace: list(messages) for namespace, messages in updates.items()}
+    with _namespace_locks_guard:
+        future = _memory_executor.submit(_run_combined_update, store, updates)
+        _pending_updates.add(future)
+    future.add_done_callback(_update_done)
+    return future
+
+def _run_combined_update(store, updates):
+    """Run a combined update while holding the locks of all its namespaces."""
+    with _namespace_locks_guard:
+        # Acquired in a fixed order so two combined updates can't deadlock
+        locks = [_namespace_locks[namespace] for namespace in sorted(updates)]
+    for lock in locks:
+        lock.acquire()
+    try:
+        update_memories(store, updates)
+    finally:
+        for lock in reversed(locks):
+            lock.release()
+
+def flush_memory_updates(timeout=None) -> None:
+    """Wait for background memory updates, e.g. before reading profiles after a run.
+
+    Args:
+        timeout: Maximum seconds to wait, or None to wait for all of them
+    """
+    wait(list(_pending_updates), timeout=timeout)
+
+async def aflush_memory_updates(timeout=None) -> None:
+    """Async version of flush_memory_updates, which doesn't block the event loop while waiting."""
+    pending = [asyncio.wrap_future(future) for future in list(_pending_updates)]
+    if pending:
+        await asyncio.wait(pending, timeout=timeout)
+
+async def astream_with_memory_updates(graph, input, config=None, **kwargs):
+    """Stream a graph run, then wait for the memory updates it submitted.
+
+    Memory updates run on background threads while the agent keeps going, so they overlap
+    with the next LLM calls; this only waits for the ones still running when the graph stops
+    (finished or interrupted), so profiles read afterwards include the run's feedback.
+
+    Args:
+        graph: Compiled graph, e.g. email_assistant
+        input: Graph input, or a Command to resume an interrupted run
+        config: Run config (thread_id etc.)
+        **kwargs: Passed to graph.astream, e.g. subgraphs=True
+
+    Yields:
+        The chunks from graph.astream (stream_mode defaults to "updates")
+    """
+    kwargs.setdefault("stream_mode", "updates")
+    async for chunk in graph.astream(input, config, **kwargs):
+        yield chunk
+    await aflush_memory_updates()
+
+# Offline workloads (eval suites, replaying HITL traces) can set BATCH_MODE=1 to send memory
+# updates through the OpenAI Batch API: half the price and no rate limits, but results
+# arrive asynchronously (within 24h). The interactive path is unchanged when it is unset.
+BATCH_MODE = os.environ.get("BATCH_MODE", "").lower() in {"1", "true", "yes"}
+# A batch is submitted once this many namespaces have queued updates, or when the oldest
+# queued update is this many seconds old (checked as updates are queued)
+MEMORY_BATCH_SIZE = int(os.environ.get("MEMORY_BATCH_SIZE", "50"))
+MEMORY_BATCH_MAX_AGE = float(os.environ.get("MEMORY_BATCH_MAX_AGE", "300"))
+
+# (id(store), namespace) -> (store, messages); one request per namespace, like the live path
+_batch_queue: dict[tuple, tuple[BaseStore, list]] = {}
+_batch_queue_started: float | None = None
+_batch_lock = threading.Lock()
+_exit_hook_registered = False
+
+@functools.cache
+def get_openai_client():
+    """OpenAI client used for the Batch API."""
+    from openai import OpenAI
+    return OpenAI()
+
+def queue_batch_memory_update(store, namespace, messages) -> Future:
+    """Queue a memory update for the next Batch API submission.
+
+    Args:
+        store: LangGraph BaseStore instance to update memory
+        namespace: Tuple defining the memory namespace, e.g. ("email_assistant", "triage_preferences")
+        messages: List of messages to update the memory with
+
+    Returns:
+        Future: Already completed; the profile is only updated by apply_memory_batch
+    """
+    global _batch_queue_started, _exit_hook_registered
+    with _batch_lock:
+        # Registered on first use rather than at import, so it runs (and logs) before a log
+        # listener set up at startup with configure_logging is stopped
+        if not _exit_hook_registered:
+            atexit.register(_submit_memory_batch_at_exit)
+            _exit_hook_registered = True
+        key = (id(store), namespace)
+        if key in _batch_queue:
+            _batch_queue[key][1].extend(messages)
+        else:
+            _batch_queue[key] = (store, list(messages))
+        if _batch_queue_started is None:
+            _batch_queue_started = time.monotonic()
+        due = (len(_batch_queue) >= MEMORY_BATCH_SIZE
+               or time.monotonic() - _batch_queue_started >= MEMORY_BATCH_MAX_AGE)
+    if due:
+        submit_memory_batch()
+    future = Future()
+    future.set_result(None)
+    return future
+
+def submit_memory_batch() -> list[str]:
+    """Submit the queued memory updates to the OpenAI Batch API.
+
+    Returns:
+        list[str]: IDs of the created batches (one per store), for apply_memory_batch
+    """
+    global _batch_queue_started
+    with _batch_lock:
+        queued, _batch_queue_started = list(_batch_queue.items()), None
+        _batch_queue.clear()
+
+    by_store: dict[int, tuple[BaseStore, list]] = {}
+    for (store_id, namespace), (store, messages) in queued:
+        by_store.setdefault(store_id, (store, []))[1].append((namespace, messages))
+
+    # Strict JSON schema, so each result parses as UserPreferences
+    response_format = {"type": "json_schema", "json_schema": {
+        "name": UserPreferences.__name__,
+        "schema": {**UserPreferences.model_json_schema(), "additionalProperties": False},
+        "strict": True,
+    }}
+    client = get_openai_client()
+    batch_ids = []
+    for store, namespaces in by_store.values():
+        lines = []
+        for namespace, messages in namespaces:
+            # The profile is read now; updates merged above share one request
+            current = store.get(namespace, "user_preferences")
+            prompt = memory_update_prompt(namespace, current.value, messages)
+            lines.append(json.dumps({
+                # The namespace is recovered from the custom_id when the results are applied
+                "custom_id": json.dumps([list(namespace), uuid.uuid4().hex]),
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": "gpt-4.1",
+                    "temperature": 0.0,
+                    "messages": convert_to_openai_messages(prompt),
+                    "response_format": response_format,
+                },
+            }))
+        batch_file = client.files.create(file=("memory_updates.jsonl", "\n".join(lines).encode()), purpose="batch")
+        batch = client.batches.create(input_file_id=batch_file.id, endpoint="/v1/chat/completions", completion_window="24h")
+        logger.info("Submitted %d memory updates as batch %s", len(lines), batch.id)
+        batch_ids.append(batch.id)
+    return batch_ids
+
+def _submit_memory_batch_at_exit() -> None:
+    """Submit the memory updates still queued when the process exits, so they aren't lost."""
+    if not _batch_queue:
+        return
+    try:
+        batch_ids = submit_memory_batch()
+    except Exception:
+        logger.exception("Could not submit the queued memory updates at exit")
+        return
+    logger.info("Submitted the queued memory updates at exit as batches %s (see apply_memory_batch)", batch_ids)
+
+def apply_memory_batch(store, batch_id: str) -> bool:
+    """Save the results of a completed memory update batch to the store.
+
+    Args:
+        store: LangGraph BaseStore instance the updates were queued for
+        batch_id: ID returned by submit_memory_batch
+
+    Returns:
+        bool: True if the batch was complete and its results were applied
+    """
+    client = get_openai_client()
+    batch = client.batches.retrieve(batch_id)
+    if batch.status != "completed":
+        return False
+    if batch.output_file_id is None:
+        logger.error("Memory update batch %s produced no output", batch_id)
+        return True
+    for line in client.files.content(batch.output_file_id).text.splitlines():
+        record = json.loads(line)
+        namespace = tuple(json.loads(record["custom_id"])[0])
+        if record.get("error") or record["response"]["status_code"] != 200:
+            logger.error("Memory update for %s failed in batch %s", namespace, batch_id)
+            continue
+        content = record["response"]["body"]["choices"][0]["message"]["content"]
+        _save_profile(store, namespace, UserPreferences.model_validate_json(content).preferences)
+    return True
@@ -1,16 +1,13 @@
 from datetime import datetime
 
 # Email assistant triage prompt 
+# Static sections come first so repeated calls share a cacheable prompt prefix
 triage_system_prompt = """
 
 < Role >
 Your role is to triage incoming emails based upon instructs and background information below.
 </ Role >
 
-< Background >
-{background}. 
-</ Background >
-
 < Instructions >
 Categorize each email into one of three categories:
 1. IGNORE - Emails that are not worth responding to or tracking
@@ -19,6 +16,10 @@ Categorize each email into one of three categories:
 Classify the below email into one of these categories.
 </ Instructions >
 
+< Background >
+{background}. 
+</ Background >
+
 < Rules >
 {triage_instructions}
 </ Rules >
@@ -110,7 +111,9 @@ When handling emails, follow these steps:
 
 # Email assistant with HITL and memory prompt 
 # Note: Currently, this is the same as the HITL prompt. However, memory specific tools (see https://langchain-ai.github.io/langmem/) can be added  
-agent_system_prompt_hitl_memory = """
+# Split in two: the static part stays identical across calls (a cacheable prompt prefix) while
+# the preferences change whenever memory is updated, so they are sent in a separate message
+agent_system_prompt_hitl_memory_static = """
 < Role >
 You are a top-notch executive assistant. 
 </ Role >
@@ -137,7 +140,9 @@ When handling emails, follow these steps:
 < Background >
 {background}
 </ Background >
+"""
 
+agent_preferences_prompt_hitl_memory = """
 < Response Preferences >
 {response_preferences}
 </ Response Preferences >
@@ -147,6 +152,8 @@ When handling emails, follow these steps:
 </ Calendar Preferences >
 """
 
+agent_system_prompt_hitl_memory = agent_system_prompt_hitl_memory_static + agent_preferences_prompt_hitl_memory
+
 # Default background information 
 default_background = """ 
 I'm Lance, a software engineer at LangChain.
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import NamedTuple
 from typing_extensions import TypedDict, Literal, Annotated
 from langgraph.graph import MessagesState
 
@@ -15,6 +15,11 @@ class RouterSchema(BaseModel):
         "'respond' for emails that need a reply",
     )
 
+class RouterDecision(NamedTuple):
+    """Classification-only routing result, parsed straight from a forced tool call."""
+
+    classification: Literal["ignore", "respond", "notify"]
+
 class StateInput(TypedDict):
     # This is the input to the state
     email_input: dict
@@ -23,6 +28,10 @@ class State(MessagesState):
     # This state class has the messages key build in
     email_input: dict
     classification_decision: Literal["ignore", "respond", "notify"]
+    # Email formatted as markdown, set once by the memory assistants' triage router
+    email_markdown: str
+    # Shortened email markdown shown in Agent Inbox, set once by the HITL assistant's triage router
+    email_preview: str
 
 class EmailData(TypedDict):
     id: str
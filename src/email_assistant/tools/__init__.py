@@ -1,10 +1,12 @@
-from src.email_assistant.tools.base import get_tools, get_tools_by_name
+from src.email_assistant.tools.base import get_tools, get_tools_by_name, get_tool_runner, dedupe_tool_calls
 from src.email_assistant.tools.default.email_tools import write_email, triage_email, Done
 from src.email_assistant.tools.default.calendar_tools import schedule_meeting, check_calendar_availability
 
 __all__ = [
     "get_tools",
     "get_tools_by_name",
+    "get_tool_runner",
+    "dedupe_tool_calls",
     "write_email",
     "triage_email",
     "Done",
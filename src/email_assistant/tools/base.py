@@ -1,4 +1,5 @@
-from typing import Dict, List, Callable, Any
+import json
+from typing import Dict, List, Callable, Any, Tuple
 from langchain_core.tools import BaseTool
 
 def get_tools(tool_names: List[str] = None, include_gmail: bool = False) -> List[BaseTool]:
@@ -55,3 +56,43 @@ def get_tools_by_name(tools: List[BaseTool] = None) -> Dict[str, BaseTool]:
         tools = get_tools()
     
     return {tool.name: tool for tool in tools}
+
+def get_tool_runner(tools: List[BaseTool]) -> Callable[[Dict], Any]:
+    """Build a function that executes tool calls for the given tools.
+
+    Calls go through tool.invoke, so the LLM's arguments are validated and coerced to the
+    tool's argument types (e.g. the meeting date strings schedule_meeting receives).
+
+    Args:
+        tools: Tools the agent can call
+
+    Returns:
+        Function taking a tool call dict and returning the tool's output
+    """
+    tools_by_name = get_tools_by_name(tools)
+
+    def run_tool(tool_call: Dict) -> Any:
+        return tools_by_name[tool_call["name"]].invoke(tool_call["args"])
+
+    return run_tool
+
+def dedupe_tool_calls(tool_calls: List[Dict]) -> Tuple[List[Dict], List[int]]:
+    """Collapse tool calls with the same name and arguments, so each distinct call runs once.
+
+    Args:
+        tool_calls: Tool calls from one agent turn
+
+    Returns:
+        The distinct tool calls, and for each of the original calls the index of its distinct
+        call (whose result it shares)
+    """
+    unique = []
+    positions = {}
+    indexes = []
+    for tool_call in tool_calls:
+        key = (tool_call["name"], json.dumps(tool_call["args"], sort_keys=True, default=str))
+        if key not in positions:
+            positions[key] = len(unique)
+            unique.append(tool_call)
+        indexes.append(positions[key])
+    return unique, indexes
@@ -2,8 +2,71 @@ from typing import List, Any
 import io
 import sys
 import json
+import re
+import hashlib
+import operator
+import atexit
+import logging
+from logging.handlers import QueueHandler, QueueListener
+from queue import Queue
 import html2text
 
+logger = logging.getLogger(__name__)
+
+def configure_logging(level: int = logging.INFO) -> None:
+    """Print the package's log records (triage decisions, memory updates) to stdout.
+
+    Meant for applications and scripts such as cron.py; the package itself only creates
+    loggers. Records are queued and written by a background listener thread, so graph nodes
+    never block on stdout. Calling it again has no effect.
+
+    Args:
+        level: Minimum level of the records to print
+    """
+    package_logger = logging.getLogger(__name__.rpartition(".")[0])
+    if any(isinstance(handler, QueueHandler) for handler in package_logger.handlers):
+        return
+    log_queue = Queue(-1)
+    listener = QueueListener(log_queue, logging.StreamHandler(sys.stdout))
+    listener.start()
+    atexit.register(listener.stop)
+    package_logger.addHandler(QueueHandler(log_queue))
+    package_logger.setLevel(level)
+
+# Mailing-list headers, which are enough on their own to classify an email as "ignore" without
+# a round-trip to the router LLM. Unsubscribe links in the body are not: transactional mail
+# (review requests, renewal reminders) carries them too, so those emails go to the router
+_BULK_MAIL_RE = re.compile(r"(?mi)^\s*(?:list-unsubscribe:|precedence:\s*(?:bulk|list|junk)\b)")
+
+def is_bulk_email(email_thread: str) -> bool:
+    """Check whether an email is bulk mail that can be ignored without calling the LLM.
+
+    Args:
+        email_thread: Email content
+
+    Returns:
+        bool: True if the email carries a mailing-list header
+    """
+    return _BULK_MAIL_RE.search(email_thread) is not None
+
+def triage_cache_key(author: str, subject: str, email_thread: str, triage_instructions: str) -> str:
+    """Key identifying a triage decision: the email plus the triage rules it was classified under.
+
+    Whitespace in the thread is normalized so re-sent copies of an email map to the same key,
+    and the rules are part of the key so updated triage preferences don't reuse old decisions.
+
+    Args:
+        author: Email sender
+        subject: Email subject
+        email_thread: Email content
+        triage_instructions: Triage rules used by the router
+
+    Returns:
+        str: Hex digest of the inputs
+    """
+    parts = (author, subject, " ".join(email_thread.split()), triage_instructions)
+    return hashlib.sha256("\x00".join(parts).encode()).hexdigest()
+
 def format_email_markdown(subject, author, to, email_thread, email_id=None):
     """Format email details into a nicely formatted markdown string for display
     
@@ -27,6 +90,20 @@ def format_email_markdown(subject, author, to, email_thread, email_id=None):
 ---
 """
 
+# Longest email body shown in an Agent Inbox description; the full text stays in state
+EMAIL_PREVIEW_MAX_CHARS = 4096
+
+def truncate_email_thread(email_thread, max_chars=EMAIL_PREVIEW_MAX_CHARS):
+    """Shorten a long email body for display, noting how much was cut.
+    
+    Args:
+        email_thread: Email content
+        max_chars: Maximum number of characters to keep
+    """
+    if len(email_thread) <= max_chars:
+        return email_thread
+    return f"{email_thread[:max_chars]}…\n[truncated, {len(email_thread) - max_chars} more characters]"
+
 def format_gmail_markdown(subject, author, to, email_thread, email_id=None):
     """Format Gmail email details into a nicely formatted markdown string for display,
     with HTML to text conversion for HTML content
@@ -108,7 +185,10 @@ Arguments:"""
             display += f"\n{tool_call['args']}\n"
     return display
 
-def parse_email(email_input: dict) -> dict:
+# Field extractor for parse_email, built once; itemgetter does the lookups in C
+_email_fields = operator.itemgetter("author", "to", "subject", "email_thread")
+
+def parse_email(email_input: dict) -> tuple[str, str, str, str]:
     """Parse an email input dictionary.
 
     Args:
@@ -125,12 +205,7 @@ def parse_email(email_input: dict) -> dict:
             - subject: Email subject line
             - email_thread: Full email content
     """
-    return (
-        email_input["author"],
-        email_input["to"],
-        email_input["subject"],
-        email_input["email_thread"],
-    )
+    return _email_fields(email_input)
 
 def parse_gmail(email_input: dict) -> tuple[str, str, str, str, str]:
     """Parse an email input dictionary for Gmail, including the email ID.
@@ -156,8 +231,8 @@ def parse_gmail(email_input: dict) -> tuple[str, str, str, str, str]:
             - email_id: Email ID (or None if not available)
     """
 
-    print("!Email_input from Gmail!")
-    print(email_input)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Email_input from Gmail: %r", email_input)
 
     # Gmail schema
     return (
@@ -281,4 +356,29 @@ def show_graph(graph, xray=False):
         import nest_asyncio
         nest_asyncio.apply()
         from langchain_core.runnables.graph import MermaidDrawMethod
-        return Image(graph.get_graph().draw_mermaid_png(draw_method=MermaidDrawMethod.PYPPETEER))
\ No newline at end of file
+        return Image(graph.get_graph().draw_mermaid_png(draw_method=MermaidDrawMethod.PYPPETEER))
+
+
+def store_node(func, afunc):
+    """Graph node that runs func under invoke() and afunc under ainvoke().
+
+    Both are called as func(state, store) with the graph's store, like a plain node function
+    taking a store argument.
+
+    Args:
+        func: Sync node function
+        afunc: Async version of func
+
+    Returns:
+        RunnableLambda: Node to pass to StateGraph.add_node
+    """
+    from langchain_core.runnables import RunnableLambda
+    from langgraph.config import get_store
+
+    def node(state):
+        return func(state, get_store())
+
+    async def anode(state):
+        return await afunc(state, get_store())
+
+    return RunnableLambda(node, afunc=anode, name=func.__name__)
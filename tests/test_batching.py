@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+
+import asyncio
+import re
+
+from pydantic import BaseModel
+
+from src.email_assistant.batching import TriageBatcher
+
+
+class Label(BaseModel):
+    """Classification of one email: here, its text."""
+    text: str
+
+class FakeStructuredLLM:
+    """Structured-output runnable labelling each email with its own text."""
+
+    def __init__(self, llm, schema):
+        self.llm = llm
+        self.schema = schema
+
+    async def ainvoke(self, messages):
+        await asyncio.sleep(self.llm.delay)
+        content = messages[-1]["content"]
+        if "results" not in self.schema.model_fields:
+            self.llm.calls.append([content])
+            return self.schema(text=content)
+        emails = re.findall(r"<email number=\d+>\n(.*?)\n</email>", content, re.DOTALL)
+        self.llm.calls.append(emails)
+        results = [Label(text=email) for email in emails]
+        return self.schema(results=results[: self.llm.max_results])
+
+class FakeLLM:
+    """Chat model recording the emails of each call (one list per call)."""
+
+    def __init__(self, delay=0.01, max_results=None):
+        self.calls = []
+        self.delay = delay
+        self.max_results = max_results
+
+    def with_structured_output(self, schema, **kwargs):
+        return FakeStructuredLLM(self, schema)
+
+def messages(email, system="triage"):
+    return [{"role": "system", "content": system}, {"role": "user", "content": email}]
+
+async def burst(batcher, emails, system="triage"):
+    """Classify emails concurrently, after a first call so the batcher is busy."""
+    first = asyncio.ensure_future(batcher.ainvoke(messages("first", system)))
+    await asyncio.sleep(0)
+    results = await asyncio.gather(*(batcher.ainvoke(messages(email, system)) for email in emails))
+    await first
+    return [result.text for result in results]
+
+def test_lone_call_is_sent_right_away():
+    llm = FakeLLM()
+    batcher = TriageBatcher(llm, Label, max_wait=10)
+
+    async def main():
+        return await asyncio.wait_for(batcher.ainvoke(messages("hello")), timeout=1)
+
+    assert asyncio.run(main()).text == "hello"
+    assert llm.calls == [["hello"]]
+    assert not batcher._tasks
+
+def test_concurrent_calls_are_batched_in_order():
+    llm = FakeLLM()
+    batcher = TriageBatcher(llm, Label, max_wait=0.01)
+
+    assert asyncio.run(burst(batcher, ["a", "b", "c"])) == ["a", "b", "c"]
+    assert llm.calls == [["first"], ["a", "b", "c"]]
+
+def test_groups_are_sent_when_full():
+    llm = FakeLLM()
+    batcher = TriageBatcher(llm, Label, max_batch_size=2, max_wait=10)
+
+    async def main():
+        return await asyncio.wait_for(burst(batcher, ["a", "b", "c", "d"]), timeout=1)
+
+    assert asyncio.run(main()) == ["a", "b", "c", "d"]
+    assert llm.calls[1:] == [["a", "b"], ["c", "d"]]
+
+def test_calls_are_grouped_by_system_prompt_and_length():
+    llm = FakeLLM()
+    batcher = TriageBatcher(llm, Label, max_wait=0.01, length_bins=(5,))
+
+    async def main():
+        first = asyncio.ensure_future(batcher.ainvoke(messages("first")))
+        await asyncio.sleep(0)
+        results = await asyncio.gather(
+            batcher.ainvoke(messages("a")),
+            batcher.ainvoke(messages("long email")),
+            batcher.ainvoke(messages("b")),
+            batcher.ainvoke(messages("c", system="other prompt")),
+            batcher.ainvoke(messages("longer email")),
+        )
+        await first
+        return [result.text for result in results]
+
+    assert asyncio.run(main()) == ["a", "long email", "b", "c", "longer email"]
+    assert sorted(llm.calls[1:]) == [["a", "b"], ["c"], ["long email", "longer email"]]
+
+def test_groups_stay_under_max_batch_chars():
+    llm = FakeLLM()
+    batcher = TriageBatcher(llm, Label, max_wait=0.01, max_batch_chars=25)
+
+    assert asyncio.run(burst(batcher, ["x" * 10, "y" * 10, "z" * 10])) == ["x" * 10, "y" * 10, "z" * 10]
+    assert llm.calls[1:] == [["x" * 10, "y" * 10], ["z" * 10]]
+
+def test_wrong_number_of_results_falls_back_to_single_calls():
+    llm = FakeLLM(max_results=1)
+    batcher = TriageBatcher(llm, Label, max_wait=0.01)
+
+    assert asyncio.run(burst(batcher, ["a", "b"])) == ["a", "b"]
+    assert sorted(llm.calls[1:]) == [["a"], ["a", "b"], ["b"]]
+
+def test_errors_reach_every_caller_of_the_group():
+    llm = FakeLLM()
+    batcher = TriageBatcher(llm, Label, max_wait=0.01)
+
+    async def fail(messages):
+        raise RuntimeError("rate limited")
+
+    batcher.batch_router.ainvoke = fail
+
+    async def main():
+        return await asyncio.gather(burst(batcher, ["a", "b"]), return_exceptions=True)
+
+    assert [type(result) for result in asyncio.run(main())] == [RuntimeError]
+    assert not batcher._tasks and not batcher._pending
@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+
+import asyncio
+
+import numpy as np
+import pytest
+
+from src.email_assistant import cache as cache_module
+from src.email_assistant.cache import CachingRouter, SemanticCache, SingleFlight
+
+
+class FakeEmbeddings:
+    """Embeddings model returning fixed vectors, counting the texts it embeds."""
+    model = "fake-embedding"
+
+    def __init__(self, vectors):
+        self.vectors = vectors
+        self.calls = []
+
+    def embed_query(self, text):
+        self.calls.append(text)
+        return self.vectors[text]
+
+    async def aembed_query(self, text):
+        return self.embed_query(text)
+
+class FakeClock:
+    """Stand-in for the time module, so TTL tests don't sleep."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+class FakeRouter:
+    """Structured-output router returning a label per email, counting its calls."""
+
+    def __init__(self, delay=0.0):
+        self.calls = []
+        self.delay = delay
+
+    def invoke(self, messages):
+        self.calls.append(messages[-1]["content"])
+        return {"classification": messages[-1]["content"]}
+
+    async def ainvoke(self, messages):
+        await asyncio.sleep(self.delay)
+        return self.invoke(messages)
+
+VECTORS = {
+    "meeting request": [1.0, 0.0, 0.0],
+    "meeting request!": [0.99, 0.1, 0.0],
+    "newsletter": [0.0, 1.0, 0.0],
+    "invoice": [0.0, 0.0, 1.0],
+}
+
+@pytest.fixture(autouse=True)
+def no_embedding_cache_dir(monkeypatch):
+    """Keep embeddings in memory unless a test passes a cache_dir."""
+    monkeypatch.delenv("EMBEDDING_CACHE_DIR", raising=False)
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(cache_module, "time", clock)
+    return clock
+
+def make_cache(**kwargs):
+    return SemanticCache(embeddings=FakeEmbeddings(VECTORS), threshold=0.9, **kwargs)
+
+def test_lookup_hits_similar_vectors_only():
+    cache = make_cache()
+    cache.insert("ns", cache.embed("meeting request"), "respond")
+
+    assert cache.lookup("ns", cache.embed("meeting request!")) == "respond"
+    assert cache.lookup("ns", cache.embed("newsletter")) is None
+    # Namespaces (system prompts) don't share entries
+    assert cache.lookup("other", cache.embed("meeting request")) is None
+
+def test_embed_reuses_recent_vectors():
+    cache = make_cache()
+    first = cache.embed("meeting request")
+    second = cache.embed("meeting request")
+
+    assert cache.embeddings.calls == ["meeting request"]
+    assert np.allclose(first, second)
+    assert np.isclose(np.linalg.norm(first), 1.0)
+
+def test_embeddings_are_shared_through_cache_dir(tmp_path):
+    writer = make_cache(cache_dir=str(tmp_path))
+    writer.embed("invoice")
+    reader = make_cache(cache_dir=str(tmp_path))
+
+    assert np.allclose(reader.embed("invoice"), writer.embed("invoice"), atol=1e-3)
+    assert reader.embeddings.calls == []
+
+def test_entries_expire_after_ttl(clock):
+    cache = make_cache(ttl=60)
+    cache.insert("ns", cache.embed("meeting request"), "respond")
+    clock.now += 30
+    cache.insert("ns", cache.embed("newsletter"), "ignore")
+
+    clock.now += 45
+    assert cache.lookup("ns", cache.embed("meeting request")) is None
+    assert cache.lookup("ns", cache.embed("newsletter")) == "ignore"
+
+    clock.now += 60
+    assert cache.lookup("ns", cache.embed("newsletter")) is None
+
+def test_oldest_entries_are_dropped_beyond_max_entries():
+    cache = make_cache(max_entries=2)
+    for text in ("meeting request", "newsletter", "invoice"):
+        cache.insert("ns", cache.embed(text), text)
+
+    assert cache.lookup("ns", cache.embed("meeting request")) is None
+    assert cache.lookup("ns", cache.embed("newsletter")) == "newsletter"
+    assert cache.lookup("ns", cache.embed("invoice")) == "invoice"
+
+def test_matrix_grows_past_its_initial_capacity():
+    cache = SemanticCache(embeddings=FakeEmbeddings({}), threshold=0.99)
+    vectors = np.eye(40, dtype=np.float32)
+    for i, vector in enumerate(vectors):
+        cache.insert("ns", vector, i)
+
+    assert [cache.lookup("ns", vector) for vector in vectors] == list(range(40))
+
+def test_evict_drops_similar_entries_and_keeps_the_rest(clock):
+    cache = make_cache(ttl=60)
+    for text in ("meeting request", "newsletter", "meeting request!", "invoice"):
+        cache.insert("ns", cache.embed(text), text)
+        clock.now += 10
+
+    assert cache.evict("ns", cache.embed("meeting request")) == 2
+    assert cache.lookup("ns", cache.embed("meeting request")) is None
+    assert cache.lookup("ns", cache.embed("invoice")) == "invoice"
+    # The kept entries are still in insertion order, so they expire oldest first
+    clock.now += 35
+    assert cache.lookup("ns", cache.embed("newsletter")) is None
+    assert cache.lookup("ns", cache.embed("invoice")) == "invoice"
+
+    assert cache.evict("missing", cache.embed("invoice")) == 0
+
+def test_single_flight_coalesces_concurrent_calls():
+    calls = []
+
+    async def call(key):
+        calls.append(key)
+        await asyncio.sleep(0.01)
+        return key.upper()
+
+    async def main():
+        single_flight = SingleFlight()
+        return await asyncio.gather(
+            single_flight.run("a", lambda: call("a")),
+            single_flight.run("a", lambda: call("a")),
+            single_flight.run("b", lambda: call("b")),
+        )
+
+    assert asyncio.run(main()) == ["A", "A", "B"]
+    assert sorted(calls) == ["a", "b"]
+
+def test_single_flight_shares_exceptions_and_forgets_finished_calls():
+    calls = []
+
+    async def fail():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def main():
+        single_flight = SingleFlight()
+        results = await asyncio.gather(single_flight.run("k", fail), single_flight.run("k", fail), return_exceptions=True)
+        await asyncio.gather(single_flight.run("k", fail), return_exceptions=True)
+        return results
+
+    assert [type(result) for result in asyncio.run(main())] == [ValueError, ValueError]
+    assert len(calls) == 2
+
+def router_messages(email):
+    return [{"role": "system", "content": "triage"}, {"role": "user", "content": email}]
+
+def test_caching_router_reuses_and_forgets_classifications():
+    router = FakeRouter()
+    caching_router = CachingRouter(router, make_cache())
+
+    assert caching_router.invoke(router_messages("meeting request")) == {"classification": "meeting request"}
+    assert caching_router.invoke(router_messages("meeting request!")) == {"classification": "meeting request"}
+    assert router.calls == ["meeting request"]
+
+    caching_router.forget(router_messages("meeting request!"))
+    assert caching_router.invoke(router_messages("meeting request!")) == {"classification": "meeting request!"}
+    assert router.calls == ["meeting request", "meeting request!"]
+
+def test_caching_router_ainvoke_calls_router_once_for_duplicates():
+    router = FakeRouter(delay=0.01)
+    caching_router = CachingRouter(router, make_cache())
+
+    async def main():
+        return await asyncio.gather(*(caching_router.ainvoke(router_messages("invoice")) for _ in range(3)))
+
+    assert asyncio.run(main()) == [{"classification": "invoice"}] * 3
+    assert router.calls == ["invoice"]
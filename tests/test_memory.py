@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+
+import threading
+
+import pytest
+from langgraph.store.memory import InMemoryStore
+
+from src.email_assistant import memory
+from src.email_assistant.memory import (
+    TRIAGE_CACHE_NAMESPACE,
+    CombinedPreferences,
+    UserPreferences,
+    flush_memory_updates,
+    get_memories,
+    get_memory,
+    invalidate_memory,
+    submit_memory_update,
+    submit_memory_updates,
+    triage_cache_ttl,
+)
+
+TRIAGE = ("email_assistant", "triage_preferences")
+RESPONSE = ("email_assistant", "response_preferences")
+
+class CountingStore(InMemoryStore):
+    """In-memory store counting the profiles read from it."""
+
+    def __init__(self):
+        super().__init__()
+        self.reads = 0
+
+    def batch(self, ops):
+        self.reads += len(ops)
+        return super().batch(ops)
+
+class FakeMemoryLLM:
+    """Memory LLM replacing the profile with the joined feedback messages."""
+
+    def __init__(self):
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def invoke(self, prompt):
+        with self._lock:
+            self.calls.append(prompt)
+        feedback = [m["content"] for m in prompt if m["role"] == "user" and not m["content"].startswith("Think carefully")]
+        return UserPreferences(preferences=" | ".join(feedback), justification="")
+
+class FakeCombinedMemoryLLM(FakeMemoryLLM):
+    """Combined memory LLM returning each profile's feedback, grouped under its instruction."""
+
+    def invoke(self, prompt):
+        with self._lock:
+            self.calls.append(prompt)
+        profiles, current = {}, None
+        for message in prompt[1:]:
+            if message["content"].startswith("Think carefully"):
+                current = next(name for name in ("triage_preferences", "response_preferences", "cal_preferences")
+                               if name in message["content"])
+                profiles[current] = []
+            else:
+                profiles[current].append(message["content"])
+        return CombinedPreferences(**{name: " | ".join(feedback) for name, feedback in profiles.items()},
+                                   **{name: None for name in ("triage_preferences", "response_preferences", "cal_preferences")
+                                      if name not in profiles},
+                                   justification="")
+
+@pytest.fixture
+def memory_llm(monkeypatch):
+    llm = FakeMemoryLLM()
+    monkeypatch.setattr(memory, "BATCH_MODE", False)
+    monkeypatch.setattr(memory, "get_memory_llm", lambda: llm)
+    return llm
+
+@pytest.fixture
+def combined_memory_llm(memory_llm, monkeypatch):
+    llm = FakeCombinedMemoryLLM()
+    monkeypatch.setattr(memory, "get_combined_memory_llm", lambda: llm)
+    return llm
+
+def feedback(text):
+    return [{"role": "user", "content": text}]
+
+def test_get_memory_seeds_default_and_caches_profile():
+    store = CountingStore()
+
+    assert get_memory(store, TRIAGE, "default") == "default"
+    assert store.get(TRIAGE, "user_preferences").value == "default"
+    reads = store.reads
+    assert get_memory(store, TRIAGE, "other default") == "default"
+    assert store.reads == reads
+
+def test_cached_profiles_expire_after_ttl(monkeypatch):
+    store = CountingStore()
+    monkeypatch.setattr(memory, "MEMORY_CACHE_TTL", 0.0)
+    get_memory(store, TRIAGE, "default")
+    reads = store.reads
+
+    get_memory(store, TRIAGE, "default")
+    assert store.reads == reads + 1
+
+def test_invalidate_memory_rereads_the_store():
+    store = CountingStore()
+    get_memory(store, TRIAGE, "default")
+    store.put(TRIAGE, "user_preferences", "edited")
+
+    assert get_memory(store, TRIAGE, "default") == "default"
+    invalidate_memory(store, TRIAGE)
+    assert get_memory(store, TRIAGE, "default") == "edited"
+
+def test_least_recently_read_profiles_are_dropped(monkeypatch):
+    store = CountingStore()
+    monkeypatch.setattr(memory, "MEMORY_CACHE_MAXSIZE", 1)
+    get_memory(store, TRIAGE, "triage")
+    get_memory(store, RESPONSE, "response")
+    reads = store.reads
+
+    get_memory(store, RESPONSE, "response")
+    assert store.reads == reads
+    get_memory(store, TRIAGE, "triage")
+    assert store.reads == reads + 1
+
+def test_get_memories_fetches_misses_in_one_batch():
+    store = CountingStore()
+    store.put(RESPONSE, "user_preferences", "stored")
+    get_memory(store, TRIAGE, "triage")
+    reads = store.reads
+
+    assert get_memories(store, [(TRIAGE, "unused"), (RESPONSE, "unused")]) == ["triage", "stored"]
+    assert store.reads == reads + 1
+
+def test_queued_updates_to_a_namespace_are_merged(memory_llm):
+    store = InMemoryStore()
+    get_memory(store, TRIAGE, "default")
+    # Hold the namespace's lock so the first update stays queued while more feedback arrives
+    lock = memory._namespace_locks[TRIAGE]
+    with lock:
+        first = submit_memory_update(store, TRIAGE, feedback("ignore newsletters"))
+        second = submit_memory_update(store, TRIAGE, feedback("respond to Alice"))
+    assert second is first
+    flush_memory_updates(timeout=5)
+
+    assert first.done()
+    assert len(memory_llm.calls) == 1
+    assert get_memory(store, TRIAGE) == "ignore newsletters | respond to Alice"
+    assert store.get(TRIAGE, "user_preferences").value == "ignore newsletters | respond to Alice"
+
+def test_updates_after_a_finished_update_run_again(memory_llm):
+    store = InMemoryStore()
+    get_memory(store, TRIAGE, "default")
+    submit_memory_update(store, TRIAGE, feedback("one"))
+    flush_memory_updates(timeout=5)
+    submit_memory_update(store, TRIAGE, feedback("two"))
+    flush_memory_updates(timeout=5)
+
+    assert len(memory_llm.calls) == 2
+    assert get_memory(store, TRIAGE) == "two"
+
+def test_submit_memory_updates_combines_profiles_into_one_call(memory_llm, combined_memory_llm):
+    store = InMemoryStore()
+    get_memories(store, [(TRIAGE, "triage"), (RESPONSE, "response")])
+
+    future = submit_memory_updates(store, {TRIAGE: feedback("ignore newsletters"), RESPONSE: feedback("be brief")})
+    flush_memory_updates(timeout=5)
+
+    assert future.done() and future.exception() is None
+    assert len(combined_memory_llm.calls) == 1
+    assert memory_llm.calls == []
+    assert get_memories(store, [(TRIAGE, None), (RESPONSE, None)]) == ["ignore newsletters", "be brief"]
+
+def test_submit_memory_updates_with_one_profile_uses_single_update(memory_llm, combined_memory_llm):
+    store = InMemoryStore()
+    get_memory(store, TRIAGE, "default")
+
+    submit_memory_updates(store, {TRIAGE: feedback("ignore newsletters")})
+    flush_memory_updates(timeout=5)
+
+    assert len(memory_llm.calls) == 1
+    assert combined_memory_llm.calls == []
+    assert submit_memory_updates(store, {}) is None
+
+def test_triage_preference_updates_clear_the_triage_cache(memory_llm):
+    store = InMemoryStore()
+    get_memories(store, [(TRIAGE, "triage"), (RESPONSE, "response")])
+    for i in range(150):
+        store.put(TRIAGE_CACHE_NAMESPACE, f"email-{i}", {"classification": "ignore"}, ttl=triage_cache_ttl(store))
+
+    submit_memory_update(store, RESPONSE, feedback("be brief"))
+    flush_memory_updates(timeout=5)
+    assert len(store.search(TRIAGE_CACHE_NAMESPACE, limit=200)) == 150
+
+    submit_memory_update(store, TRIAGE, feedback("ignore newsletters"))
+    flush_memory_updates(timeout=5)
+    assert store.search(TRIAGE_CACHE_NAMESPACE) == []